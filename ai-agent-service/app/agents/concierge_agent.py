@@ -8,12 +8,14 @@ Responsibilities:
 4. Policy Q&A: Answer questions about cancellation, pets, etc.
 5. Watches: Set price/inventory alerts
 """
+import heapq
 import re
 import uuid
 import json
+from dataclasses import dataclass
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Any, Optional, Tuple
-from sqlmodel import Session, select
+from typing import List, Dict, Any, Iterator, AsyncIterator, Optional, Tuple
+from sqlmodel import select
 
 from app.models.schemas import (
     TravelBundle, BundleRequest, BundleResponse,
@@ -21,7 +23,80 @@ from app.models.schemas import (
     FlightDeal, HotelDeal, DealTag,
     WatchRequest, WatchEvent, WatchEventType
 )
-from app.models.database import Flight, Hotel, Bundle, ChatSession, Watch, engine
+from app.models.database import Flight, Hotel, Bundle, ChatSession, Watch, async_session_factory
+from app.models.deal_bits import tags_from_bits
+from app.services.deal_index import (
+    DealSnapshot, load_snapshot, load_snapshot_async, flight_flags, hotel_flags,
+    PET_FRIENDLY, BREAKFAST_INCLUDED, NEAR_TRANSIT, REFUNDABLE, RED_EYE
+)
+from app.services.metro_codes import CITY_AIRPORTS
+from app.utils.aho_corasick import AhoCorasick
+
+
+# ==========================================
+# INTENT VOCABULARY
+# ==========================================
+
+# Checked in this order; the first trigger type present sets query_type
+QUERY_TRIGGERS = {
+    'watch': ['track', 'watch', 'alert', 'notify'],
+    'bookings_lookup': ['booking', 'bookings', 'my trips', 'reservations', 'my reservation'],
+    'policy_question': ['is it good', 'worth it', 'actually good', 'compare'],
+}
+
+CONSTRAINT_KEYWORDS = {
+    'pet_friendly': ['pet', 'dog', 'cat'],
+    'avoid_red_eye': ['no red', 'avoid red', 'not red'],
+    'breakfast_required': ['breakfast'],
+    'refundable_preferred': ['refund', 'cancel'],
+    'near_transit': ['transit', 'metro', 'subway'],
+}
+
+WARM_PHRASES = ['anywhere warm', 'somewhere warm']
+
+DATE_PATTERNS = [
+    re.compile(r'(\w+\s+\d{1,2})\s*[-–to]+\s*(\d{1,2})'),  # "Oct 25-27"
+    re.compile(r'(\d{1,2}/\d{1,2})\s*[-–to]+\s*(\d{1,2}/\d{1,2})'),  # "10/25-10/27"
+]
+BUDGET_PATTERN = re.compile(r'\$\s*([\d,]+)')
+TRAVELERS_PATTERN = re.compile(r'(\d+)\s*(people|travelers|guests|of us|persons)')
+WATCH_PRICE_PATTERN = re.compile(r'below\s*\$?([\d,]+)')
+WATCH_INVENTORY_PATTERN = re.compile(r'under\s*(\d+)\s*rooms')
+
+# Bundle search considers flights departing this many days either side of the requested date
+DEPARTURE_WINDOW_DAYS = 3
+
+# Flights searched per shard when streaming bundle results
+STREAM_SHARD_FLIGHTS = 64
+
+
+@dataclass(slots=True)
+class BundleCandidate:
+    """A scored flight+hotel pair, ranked before any Pydantic objects are built"""
+    fit_score: int
+    flight_pos: int
+    hotel_pos: int
+    flight: Flight
+    hotel: Hotel
+    
+    def rank_key(self) -> Tuple[int, int, int]:
+        # Best fit first; ties keep flight, then hotel, candidate order
+        return (-self.fit_score, self.flight_pos, self.hotel_pos)
+
+
+def _airport_code(code: Optional[str]) -> Optional[str]:
+    return code.upper() if code else None
+
+
+def _as_set(values: Optional[List[str]]) -> Optional[set]:
+    return set(values) if values is not None else None
+
+
+def _widest(current: Optional[datetime], other: Optional[datetime], pick) -> Optional[datetime]:
+    """Combine window bounds; a missing bound means unbounded"""
+    if current is None or other is None:
+        return None
+    return pick(current, other)
 
 
 class ConciergeAgent:
@@ -29,25 +104,45 @@ class ConciergeAgent:
     Chat-facing agent that understands user intent and recommends bundles.
     """
     
-    def __init__(self, websocket_manager=None):
+    def __init__(self, websocket_manager=None, watch_index=None, deal_index=None, bundle_cache=None, session_store=None):
         self.websocket_manager = websocket_manager
+        self.watch_index = watch_index
+        # Shared read model of active deals; bundle search never queries SQLite when set
+        self.deal_index = deal_index
+        # find_bundles results per normalized intent, invalidated by deal_index generation
+        self.bundle_cache = bundle_cache
+        # Write-behind ChatSession cache; without one every turn reads and writes SQLite
+        self.session_store = session_store
         
         # Common cities and their airports
-        self.city_airports = {
-            'new york': 'JFK', 'nyc': 'JFK', 'manhattan': 'JFK',
-            'los angeles': 'LAX', 'la': 'LAX',
-            'san francisco': 'SFO', 'sf': 'SFO',
-            'miami': 'MIA',
-            'chicago': 'ORD',
-            'boston': 'BOS',
-            'seattle': 'SEA',
-            'denver': 'DEN',
-            'dallas': 'DFW',
-            'atlanta': 'ATL',
-        }
+        self.city_airports = dict(CITY_AIRPORTS)
         
         # Warm destinations
         self.warm_destinations = ['MIA', 'LAX', 'SAN', 'HNL', 'TPA']
+        
+        # Every keyword parse_intent looks for, matched in one pass per message
+        self.intent_matcher = self._compile_intent_matcher()
+    
+    def _compile_intent_matcher(self) -> AhoCorasick:
+        """
+        Build one automaton over city aliases, query triggers and constraint
+        keywords. Call again after changing city_airports.
+        """
+        patterns = []
+        for priority, (city, code) in enumerate(self.city_airports.items()):
+            patterns += [
+                (f'from {city}', ('origin', priority, code)),
+                (f'{city} to', ('origin', priority, code)),
+                (f'to {city}', ('destination', priority, code)),
+                (f'{city},', ('destination', priority, code)),
+            ]
+        for query_type, words in QUERY_TRIGGERS.items():
+            patterns += [(word, ('query', query_type)) for word in words]
+        for field, words in CONSTRAINT_KEYWORDS.items():
+            patterns += [(word, ('constraint', field)) for word in words]
+        patterns += [(phrase, ('warm',)) for phrase in WARM_PHRASES]
+        patterns += [(phrase, ('travelers', 2)) for phrase in ('for two', 'for 2')]
+        return AhoCorasick(patterns)
     
     # ==========================================
     # INTENT PARSING
@@ -74,39 +169,33 @@ class ConciergeAgent:
             'query_type': 'search',  # search, refine, watch, policy_question
         }
         
+        matches = self.intent_matcher.values_in(message_lower)
+        
         # Detect query type
-        if any(word in message_lower for word in ['track', 'watch', 'alert', 'notify']):
-            intent['query_type'] = 'watch'
-        elif any(word in message_lower for word in ['booking', 'bookings', 'my trips', 'reservations', 'my reservation']):
-            intent['query_type'] = 'bookings_lookup'
-        elif any(word in message_lower for word in ['is it good', 'worth it', 'actually good', 'compare']):
-            intent['query_type'] = 'policy_question'
-        elif session and (session.origin or session.destination):
-            intent['query_type'] = 'refine'
-        
-        # Parse origin
-        for city, code in self.city_airports.items():
-            if f'from {city}' in message_lower or f'{city} to' in message_lower:
-                intent['origin'] = code
+        query_types = {value[1] for value in matches if value[0] == 'query'}
+        for query_type in QUERY_TRIGGERS:
+            if query_type in query_types:
+                intent['query_type'] = query_type
                 break
+        else:
+            if session and (session.origin or session.destination):
+                intent['query_type'] = 'refine'
+        
+        # Parse origin / destination: earliest city in city_airports order wins
+        origins = [value[1:] for value in matches if value[0] == 'origin']
+        if origins:
+            intent['origin'] = min(origins)[1]
         
-        # Parse destination
-        if 'anywhere warm' in message_lower or 'somewhere warm' in message_lower:
+        if ('warm',) in matches:
             intent['destination'] = 'WARM'  # Special flag
         else:
-            for city, code in self.city_airports.items():
-                if f'to {city}' in message_lower or f'{city},' in message_lower:
-                    intent['destination'] = code
-                    break
+            destinations = [value[1:] for value in matches if value[0] == 'destination']
+            if destinations:
+                intent['destination'] = min(destinations)[1]
         
         # Parse dates (simple patterns)
-        date_patterns = [
-            r'(\w+\s+\d{1,2})\s*[-–to]+\s*(\d{1,2})',  # "Oct 25-27"
-            r'(\d{1,2}/\d{1,2})\s*[-–to]+\s*(\d{1,2}/\d{1,2})',  # "10/25-10/27"
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, message)
+        for pattern in DATE_PATTERNS:
+            match = pattern.search(message)
             if match:
                 # Simplified date parsing
                 try:
@@ -119,7 +208,7 @@ class ConciergeAgent:
                 break
         
         # Parse budget
-        budget_match = re.search(r'\$\s*([\d,]+)', message)
+        budget_match = BUDGET_PATTERN.search(message)
         if budget_match and budget_match.group(1):
             try:
                 intent['budget'] = float(budget_match.group(1).replace(',', ''))
@@ -127,27 +216,16 @@ class ConciergeAgent:
                 pass
         
         # Parse travelers
-        travelers_match = re.search(r'(\d+)\s*(people|travelers|guests|of us|persons)', message_lower)
+        travelers_match = TRAVELERS_PATTERN.search(message_lower)
         if travelers_match:
             intent['travelers'] = int(travelers_match.group(1))
-        elif 'for two' in message_lower or 'for 2' in message_lower:
+        elif ('travelers', 2) in matches:
             intent['travelers'] = 2
         
         # Parse constraints
-        if 'pet' in message_lower or 'dog' in message_lower or 'cat' in message_lower:
-            intent['pet_friendly'] = True
-        
-        if 'no red' in message_lower or 'avoid red' in message_lower or 'not red' in message_lower:
-            intent['avoid_red_eye'] = True
-        
-        if 'breakfast' in message_lower:
-            intent['breakfast_required'] = True
-        
-        if 'refund' in message_lower or 'cancel' in message_lower:
-            intent['refundable_preferred'] = True
-        
-        if 'transit' in message_lower or 'metro' in message_lower or 'subway' in message_lower:
-            intent['near_transit'] = True
+        for value in matches:
+            if value[0] == 'constraint':
+                intent[value[1]] = True
         
         return intent
     
@@ -188,72 +266,105 @@ class ConciergeAgent:
         
         # Price vs budget (40 points max)
         total_price = flight.price + (hotel.price_per_night * 3)  # Assume 3 nights
+        score += self._budget_points(total_price, intent)
+        
+        # Constraint matching (30 points max)
+        score += self._hotel_points(hotel, intent)
+        score += self._flight_points(flight, intent)
+        
+        # Deal quality bonus (20 points max)
+        avg_deal_score = (flight.deal_score + hotel.deal_score) / 2
+        score += int(avg_deal_score / 5)  # Up to 20 points
+        
+        return max(0, min(100, score))
+    
+    def _budget_points(self, total_price: float, intent: Dict[str, Any]) -> int:
+        """Price vs budget; never increases as total_price grows"""
         budget = intent.get('budget', total_price * 2)
         
         if total_price <= budget * 0.7:
-            score += 40  # Great deal
+            return 40  # Great deal
         elif total_price <= budget * 0.85:
-            score += 30
+            return 30
         elif total_price <= budget:
-            score += 20
+            return 20
         elif total_price <= budget * 1.1:
-            score += 5
-        else:
-            score -= 20  # Over budget
-        
-        # Constraint matching (30 points max)
+            return 5
+        return -20  # Over budget
+    
+    def _hotel_points(self, hotel: Hotel, intent: Dict[str, Any]) -> int:
+        """Hotel constraint matching"""
+        points = 0
         if intent.get('pet_friendly') and hotel.pet_friendly:
-            score += 10
+            points += 10
         elif intent.get('pet_friendly') and not hotel.pet_friendly:
-            score -= 20
+            points -= 20
         
         if intent.get('breakfast_required') and hotel.breakfast_included:
-            score += 10
+            points += 10
         elif intent.get('breakfast_required') and not hotel.breakfast_included:
-            score -= 10
+            points -= 10
         
         if intent.get('near_transit') and hotel.near_transit:
-            score += 10
-        
-        if intent.get('refundable_preferred'):
-            if 'refundable' in hotel.cancellation_policy.lower():
-                score += 10
+            points += 10
         
+        if intent.get('refundable_preferred') and hotel_flags(hotel) & REFUNDABLE:
+            points += 10
+        return points
+    
+    def _flight_points(self, flight: Flight, intent: Dict[str, Any]) -> int:
+        """Flight constraint matching"""
         # Avoid red-eye
-        if intent.get('avoid_red_eye'):
-            hour = flight.departure_time.hour
-            if 23 <= hour or hour <= 5:
-                score -= 30
-        
-        # Deal quality bonus (20 points max)
-        avg_deal_score = (flight.deal_score + hotel.deal_score) / 2
-        score += int(avg_deal_score / 5)  # Up to 20 points
-        
-        return max(0, min(100, score))
+        if intent.get('avoid_red_eye') and flight_flags(flight) & RED_EYE:
+            return -30
+        return 0
     
     def create_bundle(
         self,
         flight: Flight,
         hotel: Hotel,
-        intent: Dict[str, Any]
+        intent: Dict[str, Any],
+        fit_score: Optional[int] = None,
+        deal_models: Optional[Dict[Tuple[str, str], Any]] = None
     ) -> TravelBundle:
         """Create a TravelBundle from flight and hotel"""
-        nights = 3  # Default
-        if intent.get('return_date') and intent.get('departure_date'):
-            nights = (intent['return_date'] - intent['departure_date']).days
+        nights = self._trip_nights(intent)
         
         total_price = flight.price + (hotel.price_per_night * nights)
         original_total = flight.original_price + (hotel.original_price * nights)
         savings = original_total - total_price
         
-        fit_score = self.calculate_fit_score(flight, hotel, intent)
+        if fit_score is None:
+            fit_score = self.calculate_fit_score(flight, hotel, intent)
         
         # Generate explanations
         why_bundle = self._generate_bundle_why(flight, hotel, fit_score, intent)
         tradeoffs = self._generate_tradeoffs(flight, hotel, intent)
         what_to_watch = self._generate_bundle_watch(flight, hotel)
         
-        flight_deal = FlightDeal(
+        # Deal models don't depend on the intent, so a batch can build each once
+        if deal_models is None:
+            deal_models = {}
+        flight_key, hotel_key = ('flight', flight.deal_id), ('hotel', hotel.deal_id)
+        if flight_key not in deal_models:
+            deal_models[flight_key] = self._flight_deal(flight)
+        if hotel_key not in deal_models:
+            deal_models[hotel_key] = self._hotel_deal(hotel)
+        
+        return TravelBundle(
+            bundle_id=f"BDL-{uuid.uuid4().hex[:8]}",
+            flight=deal_models[flight_key],
+            hotel=deal_models[hotel_key],
+            total_price=round(total_price, 2),
+            savings=round(max(0, savings), 2),
+            fit_score=fit_score,
+            why_this_bundle=why_bundle,
+            tradeoffs=tradeoffs,
+            what_to_watch=what_to_watch
+        )
+    
+    def _flight_deal(self, flight: Flight) -> FlightDeal:
+        return FlightDeal(
             deal_id=flight.deal_id,
             origin=flight.origin,
             destination=flight.destination,
@@ -268,13 +379,14 @@ class ConciergeAgent:
             original_price=flight.original_price,
             discount_percent=flight.discount_percent,
             deal_score=flight.deal_score,
-            tags=[DealTag(t) for t in flight.tags],
+            tags=self._deal_tags(flight),
             avg_30d_price=flight.avg_30d_price,
             why_this=flight.why_this,
             what_to_watch=flight.what_to_watch
         )
-        
-        hotel_deal = HotelDeal(
+    
+    def _hotel_deal(self, hotel: Hotel) -> HotelDeal:
+        return HotelDeal(
             deal_id=hotel.deal_id,
             name=hotel.name,
             city=hotel.city,
@@ -290,23 +402,22 @@ class ConciergeAgent:
             original_price=hotel.original_price,
             discount_percent=hotel.discount_percent,
             deal_score=hotel.deal_score,
-            tags=[DealTag(t) for t in hotel.tags],
+            tags=self._deal_tags(hotel),
             avg_30d_price=hotel.avg_30d_price,
             why_this=hotel.why_this,
             what_to_watch=hotel.what_to_watch
         )
-        
-        return TravelBundle(
-            bundle_id=f"BDL-{uuid.uuid4().hex[:8]}",
-            flight=flight_deal,
-            hotel=hotel_deal,
-            total_price=round(total_price, 2),
-            savings=round(max(0, savings), 2),
-            fit_score=fit_score,
-            why_this_bundle=why_bundle,
-            tradeoffs=tradeoffs,
-            what_to_watch=what_to_watch
-        )
+    
+    def _deal_tags(self, deal) -> List[DealTag]:
+        if deal.tag_bits is not None:
+            return tags_from_bits(deal.tag_bits)
+        return [DealTag(t) for t in deal.tags]
+    
+    def _trip_nights(self, intent: Dict[str, Any]) -> int:
+        nights = 3  # Default
+        if intent.get('return_date') and intent.get('departure_date'):
+            nights = (intent['return_date'] - intent['departure_date']).days
+        return nights
     
     def _generate_bundle_why(self, flight: Flight, hotel: Hotel, fit_score: int, intent: Dict[str, Any]) -> str:
         """Generate 'Why this bundle' explanation"""
@@ -345,7 +456,7 @@ class ConciergeAgent:
         if not hotel.breakfast_included and intent.get('breakfast_required'):
             tradeoffs.append("no breakfast")
         
-        if 'non-refund' in hotel.cancellation_policy.lower():
+        if not hotel_flags(hotel) & REFUNDABLE:
             tradeoffs.append("non-refundable")
         
         hour = flight.departure_time.hour
@@ -377,72 +488,442 @@ class ConciergeAgent:
     # SEARCH & RECOMMENDATIONS
     # ==========================================
     
-    def find_bundles(self, intent: Dict[str, Any], limit: int = 3) -> List[TravelBundle]:
-        """Find matching flight+hotel bundles based on intent"""
-        bundles = []
+    def find_bundles(
+        self,
+        intent: Dict[str, Any],
+        limit: int = 3,
+        exhaustive: bool = False,
+        snapshot: Optional[DealSnapshot] = None
+    ) -> List[TravelBundle]:
+        """
+        Find matching flight+hotel bundles based on intent.
         
-        with Session(engine) as session:
-            # Query flights
-            flight_query = select(Flight).where(Flight.is_active == True)
-            
-            if intent.get('origin'):
-                flight_query = flight_query.where(Flight.origin == intent['origin'])
-            
-            if intent.get('destination') and intent['destination'] != 'WARM':
-                flight_query = flight_query.where(Flight.destination == intent['destination'])
-            elif intent.get('destination') == 'WARM':
-                flight_query = flight_query.where(Flight.destination.in_(self.warm_destinations))
-            
-            flights = session.exec(flight_query.order_by(Flight.deal_score.desc()).limit(20)).all()
-            
-            # Query hotels
-            hotel_query = select(Hotel).where(Hotel.is_active == True)
-            
-            if intent.get('pet_friendly'):
-                hotel_query = hotel_query.where(Hotel.pet_friendly == True)
-            
-            if intent.get('breakfast_required'):
-                hotel_query = hotel_query.where(Hotel.breakfast_included == True)
+        Only flights departing within DEPARTURE_WINDOW_DAYS of the requested
+        departure date are considered.
+        
+        Runs a bounded top-k search by default. exhaustive=True scores every
+        pair instead; it is the reference the top-k search must match. Both
+        rank lightweight BundleCandidates and only build TravelBundles for
+        the results.
+        
+        Callers on the event loop pass the snapshot from bundle_snapshot()
+        so the search itself never touches SQLite.
+        """
+        filters = self._search_filters(intent)
+        if snapshot is None:
+            snapshot = self.deal_index.current if self.deal_index else load_snapshot(
+                required_hotel_flags=self._required_hotel_flags(intent), **filters
+            )
+        
+        # Only a shared index bumps generations, so only then can results be cached
+        cache_key = None
+        if self.bundle_cache is not None and self.deal_index and not exhaustive:
+            cache_key = self._bundle_cache_key(intent, limit)
+            cached = self.bundle_cache.get(cache_key, snapshot.generation)
+            if cached is not None:
+                return list(cached)
+        
+        flights, hotels_by_airport = self._search_candidates(intent, snapshot, filters)
+        
+        if exhaustive:
+            candidates = self._rank_exhaustive(flights, hotels_by_airport, intent, limit)
+        else:
+            candidates = self._rank_top_k(flights, hotels_by_airport, intent, limit)
+        
+        # Pydantic models and explanations only for the bundles returned
+        bundles = [self.create_bundle(c.flight, c.hotel, intent, c.fit_score) for c in candidates]
+        if cache_key is not None:
+            self.bundle_cache.put(cache_key, snapshot.generation, bundles)
+        return list(bundles)
+    
+    def _search_candidates(
+        self,
+        intent: Dict[str, Any],
+        snapshot: DealSnapshot,
+        filters: Dict[str, Any]
+    ) -> Tuple[List[Flight], Dict[str, List[Hotel]]]:
+        """Candidate flights (best deal first) and the matching hotels at each destination"""
+        # Candidate flights, departing within the window around the requested date
+        flights = snapshot.flights(**filters)
+        
+        # Candidate hotels
+        required_flags = self._required_hotel_flags(intent)
+        
+        # Hash join on the destination's metro code, once per destination
+        hotels_by_airport: Dict[str, List[Hotel]] = {}
+        for flight in flights:
+            if flight.destination not in hotels_by_airport:
+                hotels_by_airport[flight.destination] = snapshot.hotels_near(flight.destination, required_flags)
+        return flights, hotels_by_airport
+    
+    def _required_hotel_flags(self, intent: Dict[str, Any]) -> int:
+        required_flags = 0
+        if intent.get('pet_friendly'):
+            required_flags |= PET_FRIENDLY
+        if intent.get('breakfast_required'):
+            required_flags |= BREAKFAST_INCLUDED
+        if intent.get('near_transit'):
+            required_flags |= NEAR_TRANSIT
+        return required_flags
+    
+    def iter_bundles(
+        self,
+        intent: Dict[str, Any],
+        limit: int = 3,
+        snapshot: Optional[DealSnapshot] = None,
+        shard_size: int = STREAM_SHARD_FLIGHTS
+    ) -> Iterator[Tuple[List[TravelBundle], List[TravelBundle]]]:
+        """
+        find_bundles in shards of shard_size flights, for streaming.
+        
+        Yields (new bundles, current top `limit`) after each shard that
+        changes the running top. Shards partition the candidate flights and
+        keep their positions in the full list, so the last top yielded is
+        exactly what find_bundles returns. A bundle keeps its bundle_id from
+        the frame it first appears in.
+        """
+        filters = self._search_filters(intent)
+        if snapshot is None:
+            snapshot = self.deal_index.current if self.deal_index else load_snapshot(
+                required_hotel_flags=self._required_hotel_flags(intent), **filters
+            )
+        
+        flights = snapshot.flights(**filters)
+        required_flags = self._required_hotel_flags(intent)
+        
+        # Shards hold one destination's flights, so the first frame only
+        # pays for matching and ranking that destination's hotels
+        positions_by_airport: Dict[str, List[int]] = {}
+        for fpos, flight in enumerate(flights):
+            positions_by_airport.setdefault(flight.destination, []).append(fpos)
+        
+        hotels_by_airport: Dict[str, List[Hotel]] = {}
+        pools: Dict[str, Tuple[List[Tuple[int, int, Hotel]], float]] = {}
+        top: List[BundleCandidate] = []
+        materialized: Dict[Tuple[int, int], TravelBundle] = {}
+        for airport, positions in positions_by_airport.items():
+            hotels_by_airport[airport] = snapshot.hotels_near(airport, required_flags)
+            pools.update(self._hotel_pools({airport: hotels_by_airport[airport]}, intent))
+            for start in range(0, len(positions), shard_size):
+                shard_positions = positions[start:start + shard_size]
+                # Seeded with the running top, so a shard that can't improve it stops early
+                top = self._rank_top_k(
+                    [flights[fpos] for fpos in shard_positions], hotels_by_airport, intent, limit,
+                    positions=shard_positions, pools=pools, seed=top
+                )
+                
+                new_bundles = []
+                for c in top:
+                    if (c.flight_pos, c.hotel_pos) not in materialized:
+                        bundle = self.create_bundle(c.flight, c.hotel, intent, c.fit_score)
+                        materialized[(c.flight_pos, c.hotel_pos)] = bundle
+                        new_bundles.append(bundle)
+                if new_bundles:
+                    yield new_bundles, [materialized[(c.flight_pos, c.hotel_pos)] for c in top]
+    
+    def find_bundles_batch(
+        self,
+        intents: List[Dict[str, Any]],
+        limit: int = 3,
+        snapshot: Optional[DealSnapshot] = None
+    ) -> List[List[TravelBundle]]:
+        """
+        find_bundles for many intents against one snapshot, in input order.
+        
+        Intents with the same origin share one flight retrieval covering all
+        their windows and destinations, split per destination; hotel matches
+        and hotel rankings are shared by intents with the same constraints.
+        Each result equals find_bundles for that intent on the same snapshot.
+        """
+        if snapshot is None:
+            snapshot = self.deal_index.current if self.deal_index else load_snapshot()
+        
+        results: List[Optional[List[TravelBundle]]] = [None] * len(intents)
+        pending = []
+        for i, intent in enumerate(intents):
+            cache_key = None
+            if self.bundle_cache is not None and self.deal_index:
+                cache_key = self._bundle_cache_key(intent, limit)
+                cached = self.bundle_cache.get(cache_key, snapshot.generation)
+                if cached is not None:
+                    results[i] = list(cached)
+                    continue
+            pending.append((i, intent, self._search_filters(intent), cache_key))
+        
+        # One retrieval per origin, wide enough for every intent from it
+        spans: Dict[Optional[str], Dict[str, Any]] = {}
+        for _, _, filters, _ in pending:
+            span = spans.get(filters['origin'])
+            if span is None:
+                spans[filters['origin']] = dict(filters, destinations=_as_set(filters['destinations']))
+                continue
+            if span['destinations'] is not None:
+                span['destinations'] = None if filters['destinations'] is None else span['destinations'] | set(filters['destinations'])
+            span['departs_after'] = _widest(span['departs_after'], filters['departs_after'], min)
+            span['departs_before'] = _widest(span['departs_before'], filters['departs_before'], max)
+        
+        retrieved: Dict[Optional[str], Tuple[Dict[str, Any], List[Flight], Dict[str, List[Flight]]]] = {}
+        for origin, span in spans.items():
+            flights = snapshot.flights(**span)
+            by_destination: Dict[str, List[Flight]] = {}
+            for flight in flights:
+                by_destination.setdefault(flight.destination, []).append(flight)
+            retrieved[origin] = (span, flights, by_destination)
+        
+        hotels_memo: Dict[Tuple[str, int], List[Hotel]] = {}
+        deal_models: Dict[Tuple[str, str], Any] = {}
+        pools_memo: Dict[Tuple[str, int, bool], Optional[Tuple[List[Tuple[int, int, Hotel]], float]]] = {}
+        
+        for i, intent, filters, cache_key in pending:
+            span, origin_flights, by_destination = retrieved[filters['origin']]
             
-            if intent.get('near_transit'):
-                hotel_query = hotel_query.where(Hotel.near_transit == True)
+            # Filtering an ordered list keeps the best-deal-first order snapshot.flights gives
+            destinations = filters['destinations']
+            if destinations is not None and len(destinations) == 1:
+                flights = by_destination.get(destinations[0], [])
+            elif destinations is not None:
+                wanted = set(destinations)
+                flights = [f for f in origin_flights if f.destination in wanted]
+            else:
+                flights = origin_flights
             
-            hotels = session.exec(hotel_query.order_by(Hotel.deal_score.desc()).limit(20)).all()
+            after, before = filters['departs_after'], filters['departs_before']
+            if (after, before) != (span['departs_after'], span['departs_before']):
+                flights = [
+                    f for f in flights
+                    if (after is None or f.departure_time >= after)
+                    and (before is None or f.departure_time < before)
+                ]
             
-            # Create bundles
+            required_flags = self._required_hotel_flags(intent)
+            pool_key = bool(intent.get('refundable_preferred'))
+            hotels_by_airport: Dict[str, List[Hotel]] = {}
+            pools: Dict[str, Tuple[List[Tuple[int, int, Hotel]], float]] = {}
             for flight in flights:
-                # Match hotels to flight destination city
-                matching_hotels = [h for h in hotels if self._city_matches_airport(h.city, flight.destination)]
+                airport = flight.destination
+                if airport in hotels_by_airport:
+                    continue
+                if (airport, required_flags) not in hotels_memo:
+                    hotels_memo[(airport, required_flags)] = snapshot.hotels_near(airport, required_flags)
+                hotels_by_airport[airport] = hotels_memo[(airport, required_flags)]
                 
-                for hotel in matching_hotels[:3]:
-                    bundle = self.create_bundle(flight, hotel, intent)
-                    
-                    # Filter by budget
-                    if intent.get('budget') and bundle.total_price > intent['budget'] * 1.1:
-                        continue
-                    
-                    bundles.append(bundle)
+                # Hotel bounds depend only on the hotel constraints, which required_flags and pool_key cover
+                if (airport, required_flags, pool_key) not in pools_memo:
+                    pools_memo[(airport, required_flags, pool_key)] = self._hotel_pools(
+                        {airport: hotels_by_airport[airport]}, intent
+                    ).get(airport)
+                pool = pools_memo[(airport, required_flags, pool_key)]
+                if pool:
+                    pools[airport] = pool
             
-            # Sort by fit score and limit
-            bundles.sort(key=lambda b: b.fit_score, reverse=True)
-            return bundles[:limit]
-    
-    def _city_matches_airport(self, city: str, airport: str) -> bool:
-        """Check if city matches airport code"""
-        city_lower = city.lower()
-        airport_to_city = {
-            'JFK': ['new york', 'nyc', 'manhattan', 'brooklyn'],
-            'LAX': ['los angeles', 'la', 'hollywood'],
-            'SFO': ['san francisco', 'sf'],
-            'MIA': ['miami', 'south beach'],
-            'ORD': ['chicago'],
-            'BOS': ['boston'],
-            'SEA': ['seattle'],
-            'DEN': ['denver'],
+            candidates = self._rank_top_k(flights, hotels_by_airport, intent, limit, pools=pools)
+            bundles = [self.create_bundle(c.flight, c.hotel, intent, c.fit_score, deal_models) for c in candidates]
+            if cache_key is not None:
+                self.bundle_cache.put(cache_key, snapshot.generation, bundles)
+            results[i] = list(bundles)
+        
+        return results
+    
+    async def bundle_snapshot(self, intent: Optional[Dict[str, Any]] = None) -> DealSnapshot:
+        """
+        Deals find_bundles should search: the shared index, or via aiosqlite
+        just this intent's flights and hotels (every active deal without an
+        intent).
+        """
+        if self.deal_index:
+            return self.deal_index.current
+        if intent is None:
+            return await load_snapshot_async()
+        return await load_snapshot_async(
+            required_hotel_flags=self._required_hotel_flags(intent), **self._search_filters(intent)
+        )
+    
+    def _search_filters(self, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Flight filters for an intent, as DealSnapshot.flights and load_snapshot
+        take them. Airport codes are upper-cased like _bundle_cache_key does,
+        since the snapshot matches them exactly.
+        """
+        destination = _airport_code(intent.get('destination'))
+        destinations = None
+        if destination == 'WARM':
+            destinations = self.warm_destinations
+        elif destination:
+            destinations = [destination]
+        
+        departs_after, departs_before = self._departure_window(intent)
+        return {
+            'origin': _airport_code(intent.get('origin')),
+            'destinations': destinations,
+            'departs_after': departs_after,
+            'departs_before': departs_before,
         }
+    
+    def _departure_window(self, intent: Dict[str, Any]) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """[start, end) of departure times to search, or (None, None) without a departure date"""
+        departure = intent.get('departure_date')
+        if not departure:
+            return None, None
+        if isinstance(departure, datetime):
+            departure = departure.date()
+        start = datetime.combine(departure - timedelta(days=DEPARTURE_WINDOW_DAYS), datetime.min.time())
+        return start, start + timedelta(days=2 * DEPARTURE_WINDOW_DAYS + 1)
+    
+    def _bundle_cache_key(self, intent: Dict[str, Any], limit: int) -> Tuple:
+        """
+        Everything find_bundles' result depends on. The budget is kept exact
+        rather than banded: fit scores and the budget filter compare totals
+        against it directly, so nearby budgets can rank bundles differently.
+        """
+        return (
+            _airport_code(intent.get('origin')),
+            _airport_code(intent.get('destination')),
+            intent.get('budget'),
+            self._departure_window(intent)[0],
+            self._trip_nights(intent),
+            bool(intent.get('pet_friendly')),
+            bool(intent.get('breakfast_required')),
+            bool(intent.get('near_transit')),
+            bool(intent.get('avoid_red_eye')),
+            bool(intent.get('refundable_preferred')),
+            limit,
+        )
+    
+    def _bundle_total(self, flight: Flight, hotel: Hotel, nights: int) -> float:
+        """Total price as create_bundle reports it"""
+        return round(flight.price + (hotel.price_per_night * nights), 2)
+    
+    def _rank_exhaustive(
+        self,
+        flights: List[Flight],
+        hotels_by_airport: Dict[str, List[Hotel]],
+        intent: Dict[str, Any],
+        limit: int
+    ) -> List[BundleCandidate]:
+        """Score every flight × matching-hotel pair, sort, and keep the best"""
+        nights = self._trip_nights(intent)
+        max_total = intent['budget'] * 1.1 if intent.get('budget') else None
+        candidates = []
+        
+        for fpos, flight in enumerate(flights):
+            for hpos, hotel in enumerate(hotels_by_airport[flight.destination]):
+                # Filter by budget
+                if max_total is not None and self._bundle_total(flight, hotel, nights) > max_total:
+                    continue
+                
+                fit_score = self.calculate_fit_score(flight, hotel, intent)
+                candidates.append(BundleCandidate(fit_score, fpos, hpos, flight, hotel))
         
-        cities = airport_to_city.get(airport, [])
-        return any(c in city_lower for c in cities) or city_lower in str(airport).lower()
+        # Sort by fit score and limit
+        candidates.sort(key=BundleCandidate.rank_key)
+        return candidates[:limit]
+    
+    def _rank_top_k(
+        self,
+        flights: List[Flight],
+        hotels_by_airport: Dict[str, List[Hotel]],
+        intent: Dict[str, Any],
+        limit: int,
+        positions: Optional[List[int]] = None,
+        pools: Optional[Dict[str, Tuple[List[Tuple[int, int, Hotel]], float]]] = None,
+        seed: Optional[List[BundleCandidate]] = None
+    ) -> List[BundleCandidate]:
+        """
+        Best `limit` bundles without scoring every pair.
+        
+        calculate_fit_score splits into a budget term (never rising with
+        price), flight-only and hotel-only constraint terms and a deal-score
+        term, so a pair's score is bounded by the flight's terms at the
+        cheapest matching hotel plus the best hotel's terms. Flights and
+        their hotels are walked in bound order, and the walk stops once no
+        remaining pair can displace the current k-th result. Ties rank by
+        (flight position, hotel position) to match the exhaustive sort;
+        positions gives a subset of the flight list its original positions,
+        pools from _hotel_pools can be shared between subsets, and seed
+        carries over the best candidates found in earlier subsets.
+        """
+        if limit <= 0:
+            return []
+        
+        nights = self._trip_nights(intent)
+        max_total = intent['budget'] * 1.1 if intent.get('budget') else None
+        
+        if pools is None:
+            pools = self._hotel_pools(hotels_by_airport, intent)
+        
+        ranked_flights = []
+        for fpos, flight in zip(positions, flights) if positions is not None else enumerate(flights):
+            pool = pools.get(flight.destination)
+            if not pool:
+                continue
+            hotels, min_price = pool
+            flight_bound = 10 * (
+                50
+                + self._budget_points(flight.price + (min_price * 3), intent)
+                + self._flight_points(flight, intent)
+            ) + flight.deal_score
+            ranked_flights.append((flight_bound + hotels[0][0], flight_bound, fpos, flight))
+        ranked_flights.sort(key=lambda c: c[0], reverse=True)
+        
+        # Min-heap of (fit, -flight position, -hotel position): the k-th best is on top
+        heap: List[Tuple[int, int, int, Flight, Hotel]] = [
+            (c.fit_score, -c.flight_pos, -c.hotel_pos, c.flight, c.hotel) for c in seed or ()
+        ]
+        heapq.heapify(heap)
+        
+        def cap(bound10: int) -> int:
+            return max(0, min(100, bound10 // 10))
+        
+        for pair_bound, flight_bound, fpos, flight in ranked_flights:
+            if len(heap) == limit:
+                bound = cap(pair_bound)
+                if bound < heap[0][0]:
+                    break  # No later flight has a higher bound
+                if bound == heap[0][0] and fpos > -heap[0][1]:
+                    continue  # Could only tie, and would rank after the k-th
+            
+            for hotel_bound, hpos, hotel in pools[flight.destination][0]:
+                if len(heap) == limit:
+                    bound = cap(flight_bound + hotel_bound)
+                    if bound < heap[0][0]:
+                        break
+                    if bound == heap[0][0] and (fpos, hpos) > (-heap[0][1], -heap[0][2]):
+                        continue
+                
+                # Filter by budget
+                if max_total is not None and self._bundle_total(flight, hotel, nights) > max_total:
+                    continue
+                
+                entry = (self.calculate_fit_score(flight, hotel, intent), -fpos, -hpos, flight, hotel)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry[:3] > heap[0][:3]:
+                    heapq.heapreplace(heap, entry)
+        
+        candidates = [
+            BundleCandidate(fit_score, -neg_fpos, -neg_hpos, flight, hotel)
+            for fit_score, neg_fpos, neg_hpos, flight, hotel in heap
+        ]
+        candidates.sort(key=BundleCandidate.rank_key)
+        return candidates
+    
+    def _hotel_pools(
+        self,
+        hotels_by_airport: Dict[str, List[Hotel]],
+        intent: Dict[str, Any]
+    ) -> Dict[str, Tuple[List[Tuple[int, int, Hotel]], float]]:
+        """Per airport: hotels ranked by their 10x bound terms, and the cheapest nightly price"""
+        # Bounds are kept at 10x so the deal-score term stays integral
+        pools: Dict[str, Tuple[List[Tuple[int, int, Hotel]], float]] = {}
+        for airport, hotels in hotels_by_airport.items():
+            if hotels:
+                ranked = sorted(
+                    ((10 * self._hotel_points(h, intent) + h.deal_score, pos, h) for pos, h in enumerate(hotels)),
+                    key=lambda c: c[0],
+                    reverse=True
+                )
+                pools[airport] = (ranked, min(h.price_per_night for h in hotels))
+        return pools
     
     # ==========================================
     # CHAT HANDLING
@@ -452,62 +933,92 @@ class ConciergeAgent:
         """Handle incoming chat message"""
         session_id = request.session_id or f"session-{uuid.uuid4().hex[:8]}"
         
-        # Load or create session
-        with Session(engine) as db_session:
-            chat_session = db_session.exec(
-                select(ChatSession).where(ChatSession.session_id == session_id)
-            ).first()
+        chat_session, intent, response = await self._begin_turn(request, session_id)
+        if response:
+            return response
+        
+        # Search for bundles
+        snapshot = await self.bundle_snapshot(intent)
+        bundles = self.find_bundles(intent, snapshot=snapshot)
+        
+        await self._remember_constraints(chat_session, intent)
+        return self._bundles_response(intent, bundles, session_id)
+    
+    async def stream_message(self, request: ChatRequest) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Handle a chat message as a stream of WebSocket frames: a chat_ack
+        straight away, bundle_partial frames as the search finds bundles
+        that enter the top results, then the same chat_response that
+        handle_message would return.
+        """
+        session_id = request.session_id or f"session-{uuid.uuid4().hex[:8]}"
+        yield {'type': 'chat_ack', 'session_id': session_id}
+        
+        chat_session, intent, response = await self._begin_turn(request, session_id)
+        if response is None:
+            snapshot = await self.bundle_snapshot(intent)
+            bundles: List[TravelBundle] = []
+            for new_bundles, top in self.iter_bundles(intent, snapshot=snapshot):
+                bundles = top
+                yield {
+                    'type': 'bundle_partial',
+                    'session_id': session_id,
+                    'bundles': [b.model_dump(mode='json') for b in new_bundles],
+                    # bundle_ids of the current top results, best first; earlier bundles may drop out
+                    'ranking': [b.bundle_id for b in top],
+                }
             
-            if not chat_session:
-                chat_session = ChatSession(session_id=session_id)
-                db_session.add(chat_session)
-                db_session.commit()
-                db_session.refresh(chat_session)
+            await self._remember_constraints(chat_session, intent)
+            response = self._bundles_response(intent, bundles, session_id)
+        
+        yield {'type': 'chat_response', 'data': response.model_dump(mode='json')}
+    
+    async def _begin_turn(
+        self,
+        request: ChatRequest,
+        session_id: str
+    ) -> Tuple[ChatSession, Dict[str, Any], Optional[ChatResponse]]:
+        """Load the session and parse intent; returns a response unless a bundle search is needed"""
+        # Load or create session
+        chat_session = await self._load_chat_session(session_id, known_new=not request.session_id)
         
         # Parse intent
         intent = self.parse_intent(request.message, chat_session)
         
         # Handle different query types
         if intent['query_type'] == 'watch':
-            return await self._handle_watch_request(request.message, session_id)
+            return chat_session, intent, await self._handle_watch_request(request.message, session_id)
         
         if intent['query_type'] == 'bookings_lookup':
-            return self._handle_bookings_lookup(request.message, session_id)
+            return chat_session, intent, self._handle_bookings_lookup(request.message, session_id)
         
         if intent['query_type'] == 'policy_question':
-            return self._handle_policy_question(request.message, session_id)
+            return chat_session, intent, self._handle_policy_question(request.message, session_id)
         
         # Check if we need clarification (only for search queries)
         clarifying = self.get_clarifying_question(intent, intent['query_type'])
         if clarifying:
-            return ChatResponse(
+            return chat_session, intent, ChatResponse(
                 message="I'd love to help you find the perfect trip!",
                 clarifying_question=clarifying,
                 session_id=session_id
             )
         
-        # Search for bundles
-        bundles = self.find_bundles(intent)
-        
-        # Update session with extracted constraints
-        with Session(engine) as db_session:
-            chat_session = db_session.exec(
-                select(ChatSession).where(ChatSession.session_id == session_id)
-            ).first()
-            
-            if chat_session:
-                chat_session.origin = intent.get('origin')
-                chat_session.destination = intent.get('destination')
-                chat_session.budget = intent.get('budget')
-                chat_session.travelers = intent.get('travelers', 1)
-                chat_session.pet_friendly = intent.get('pet_friendly', False)
-                chat_session.avoid_red_eye = intent.get('avoid_red_eye', False)
-                chat_session.breakfast_required = intent.get('breakfast_required', False)
-                chat_session.updated_at = datetime.utcnow()
-                db_session.add(chat_session)
-                db_session.commit()
-        
-        # Generate response
+        return chat_session, intent, None
+    
+    async def _remember_constraints(self, chat_session: ChatSession, intent: Dict[str, Any]):
+        """Update session with extracted constraints"""
+        chat_session.origin = intent.get('origin')
+        chat_session.destination = intent.get('destination')
+        chat_session.budget = intent.get('budget')
+        chat_session.travelers = intent.get('travelers', 1)
+        chat_session.pet_friendly = intent.get('pet_friendly', False)
+        chat_session.avoid_red_eye = intent.get('avoid_red_eye', False)
+        chat_session.breakfast_required = intent.get('breakfast_required', False)
+        await self._save_chat_session(chat_session)
+    
+    def _bundles_response(self, intent: Dict[str, Any], bundles: List[TravelBundle], session_id: str) -> ChatResponse:
+        """Chat reply for a finished bundle search"""
         if bundles:
             constraints = []
             if intent.get('pet_friendly'):
@@ -538,11 +1049,39 @@ class ConciergeAgent:
                 session_id=session_id
             )
     
+    async def _load_chat_session(self, session_id: str, known_new: bool = False) -> ChatSession:
+        """Session state from the write-behind store, or straight from SQLite without one"""
+        if self.session_store is not None:
+            return await self.session_store.get_or_create(session_id, known_new=known_new)
+        
+        async with async_session_factory() as db_session:
+            chat_session = (await db_session.exec(
+                select(ChatSession).where(ChatSession.session_id == session_id)
+            )).first()
+            
+            if not chat_session:
+                chat_session = ChatSession(session_id=session_id)
+                db_session.add(chat_session)
+                await db_session.commit()
+                await db_session.refresh(chat_session)
+        return chat_session
+    
+    async def _save_chat_session(self, chat_session: ChatSession):
+        """Queue the session for the next batch flush, or write it now without a store"""
+        if self.session_store is not None:
+            self.session_store.mark_dirty(chat_session)
+            return
+        
+        chat_session.updated_at = datetime.utcnow()
+        async with async_session_factory() as db_session:
+            db_session.add(chat_session)
+            await db_session.commit()
+    
     async def _handle_watch_request(self, message: str, session_id: str) -> ChatResponse:
         """Handle watch/alert request"""
         # Parse thresholds from message
-        price_match = re.search(r'below\s*\$?([\d,]+)', message.lower())
-        inventory_match = re.search(r'under\s*(\d+)\s*rooms', message.lower())
+        price_match = WATCH_PRICE_PATTERN.search(message.lower())
+        inventory_match = WATCH_INVENTORY_PATTERN.search(message.lower())
         
         price_threshold = float(price_match.group(1).replace(',', '')) if price_match else None
         inventory_threshold = int(inventory_match.group(1)) if inventory_match else None
@@ -550,7 +1089,7 @@ class ConciergeAgent:
         # Create watch (simplified)
         watch_id = f"watch-{uuid.uuid4().hex[:8]}"
         
-        with Session(engine) as db_session:
+        async with async_session_factory() as db_session:
             watch = Watch(
                 watch_id=watch_id,
                 user_id=session_id,
@@ -560,7 +1099,11 @@ class ConciergeAgent:
                 inventory_threshold=inventory_threshold
             )
             db_session.add(watch)
-            db_session.commit()
+            await db_session.commit()
+            await db_session.refresh(watch)
+        
+        if self.watch_index:
+            self.watch_index.add(watch)
         
         conditions = []
         if price_threshold:
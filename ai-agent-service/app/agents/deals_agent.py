@@ -2,25 +2,49 @@
 Deals Agent - Backend Worker
 
 Responsibilities:
-1. Feed Ingestion: Consume CSV/mock feeds via Kafka
+1. Feed Ingestion: Consume mock or file feeds (see app.services.feed_sources)
 2. Deal Detection: Apply rules (≥15% below 30-day avg, limited inventory, promo)
+   against rolling averages kept in PriceHistory
 3. Offer Tagging: Tag with metadata (refundable, pet-friendly, etc.)
 4. Emit Updates: Publish to Kafka topics for downstream consumers
+
+Scans run as a staged pipeline (ingest → diff → detect → tag → persist → emit)
+with blocking database work on a dedicated executor. Listings whose
+fingerprint is unchanged since the last scan are skipped.
 """
 import asyncio
+import functools
+import hashlib
 import json
+import time
 import uuid
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from sqlmodel import Session, select
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from sqlalchemy import update
 
 from app.models.schemas import (
     DealTag, DealScore, DealDetectionResult,
     FlightDeal, HotelDeal, DealType
 )
 from app.models.database import (
-    Flight, Hotel, PriceHistory, engine, create_db_and_tables
+    Flight, Hotel, Watch, engine, create_db_and_tables, bulk_upsert
+)
+from app.models.deal_bits import (
+    amenities_to_bits, flight_flag_bits, hotel_flag_bits, is_red_eye,
+    is_refundable_fare, is_refundable_policy, tags_to_bits
+)
+from app.services.price_history import record_prices, rolling_averages
+from app.services.scan_pipeline import ScanPipeline, ScanBatch
+from app.services.feed_sources import FeedSource, MockFeedSource
+from app.services.websocket_manager import DealEventBatcher
+from app.services import metrics
+from app.services.metro_codes import metro_for_city
+from app.services.city_search import city_key
+from app.services.deal_scoring import (
+    BatchDealScores, score_deals_batch, detection_result, explain_deal
 )
 
 
@@ -29,11 +53,55 @@ class DealsAgent:
     Backend worker that processes feeds, detects deals, and emits events.
     """
     
-    def __init__(self, kafka_producer=None, websocket_manager=None):
+    # Price and inventory fields per deal type
+    PRICE_INVENTORY_KEYS = {
+        'flight': ('price', 'seats_available'),
+        'hotel': ('price_per_night', 'rooms_available'),
+    }
+    
+    def __init__(
+        self,
+        kafka_producer=None,
+        websocket_manager=None,
+        watch_index=None,
+        deal_index=None,
+        feed_sources: Optional[List[FeedSource]] = None,
+        bulk_persist: bool = True,
+        init_db: bool = True
+    ):
         self.kafka_producer = kafka_producer
         self.websocket_manager = websocket_manager
+        self.watch_index = watch_index
+        self.deal_index = deal_index
+        self.bulk_persist = bulk_persist
+        
+        # Where scans read listings from; mock data unless configured
+        self.feed_sources: List[FeedSource] = feed_sources or [
+            MockFeedSource('flight', self.generate_mock_flights, 50),
+            MockFeedSource('hotel', self.generate_mock_hotels, 50),
+        ]
         self._running = False
-        create_db_and_tables()
+        
+        # Single writer thread keeps blocking SQLite work off the event loop
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deals-db')
+        self.pipeline: Optional[ScanPipeline] = None
+        
+        # Fingerprint per deal_id seen by the last completed scan, used to skip
+        # unchanged listings; replaced after every scan so it never outgrows one feed
+        self._fingerprints: Dict[str, int] = {}
+        self._pending_fingerprints: Dict[str, int] = {}
+        
+        # Counters for the current scan
+        self._scan_deals = {'flight': 0, 'hotel': 0}
+        self._scan_changes = {'processed': 0, 'skipped': 0, 'changed': 0, 'new': 0}
+        self._rows_written = 0
+        self._persist_seconds = 0.0
+        self._event_batcher: Optional[DealEventBatcher] = None
+        # Scheduled and manually triggered scans share the counters above
+        self._scan_lock = asyncio.Lock()
+        # Offline scan workers only detect and tag; the parent process owns the database
+        if init_db:
+            create_db_and_tables()
     
     # ==========================================
     # DEAL DETECTION
@@ -107,22 +175,46 @@ class DealsAgent:
             total_score=total_score
         )
         
-        # Generate explanation
-        explanations = []
-        if DealTag.PRICE_DROP in tags:
-            discount = ((avg_30d_price - current_price) / avg_30d_price * 100) if avg_30d_price else 0
-            explanations.append(f"{discount:.0f}% below 30-day avg")
-        if DealTag.LIMITED_AVAILABILITY in tags:
-            explanations.append(f"Only {inventory} left")
-        if DealTag.PROMO in tags:
-            explanations.append(f"Promo ends in {promo_end_days} days")
-        
         return DealDetectionResult(
             is_deal=is_deal,
             score=score,
             tags=tags,
-            explanation=" • ".join(explanations) if explanations else "Standard pricing"
+            explanation=explain_deal(tags, current_price, avg_30d_price, inventory, promo_end_days)
+        )
+    
+    def detect_deals_batch(self, deal_type: str, rows: List[Dict[str, Any]]) -> Tuple[BatchDealScores, np.ndarray]:
+        """
+        Score a batch of flight or hotel rows in one vectorized pass.
+        Returns the scores and the promo end days drawn for each row.
+        """
+        price_key, inventory_key = self.PRICE_INVENTORY_KEYS[deal_type]
+        n = len(rows)
+        
+        prices = np.fromiter((r[price_key] for r in rows), dtype=np.float64, count=n)
+        avg_prices = np.fromiter(
+            (r.get('avg_30d_price') or np.nan for r in rows), dtype=np.float64, count=n
         )
+        inventory = np.fromiter((r.get(inventory_key, 100) for r in rows), dtype=np.int64, count=n)
+        is_promo = np.fromiter((bool(r.get('is_promo', False)) for r in rows), dtype=bool, count=n)
+        promo_end_days = np.where(is_promo, np.random.randint(1, 8, size=n), 0)
+        
+        scores = score_deals_batch(prices, avg_prices, inventory, is_promo, promo_end_days)
+        return scores, promo_end_days
+    
+    def _batch_detections(self, deal_type: str, rows: List[Dict[str, Any]]):
+        """Yield (row, DealDetectionResult) for the rows of a batch that are deals"""
+        price_key, inventory_key = self.PRICE_INVENTORY_KEYS[deal_type]
+        scores, promo_end_days = self.detect_deals_batch(deal_type, rows)
+        
+        for i in np.flatnonzero(scores.is_deal):
+            row = rows[i]
+            yield row, detection_result(
+                scores, i,
+                current_price=row[price_key],
+                avg_30d_price=row.get('avg_30d_price'),
+                inventory=row.get(inventory_key, 100),
+                promo_end_days=int(promo_end_days[i])
+            )
     
     # ==========================================
     # OFFER TAGGING
@@ -133,19 +225,16 @@ class DealsAgent:
         tags = []
         
         # Refundability
-        fare_class = flight_data.get('fare_class', '').lower()
-        if fare_class in ['business', 'first', 'flex']:
+        if is_refundable_fare(flight_data.get('fare_class')):
             tags.append(DealTag.REFUNDABLE)
         else:
             tags.append(DealTag.NON_REFUNDABLE)
         
         # Red-eye detection (departure between 11pm-5am)
         departure = flight_data.get('departure_time')
-        if departure:
-            hour = departure.hour if isinstance(departure, datetime) else 0
-            if 23 <= hour or hour <= 5:
-                # Not a tag, but tracked for filtering
-                flight_data['is_red_eye'] = True
+        if isinstance(departure, datetime) and is_red_eye(departure):
+            # Not a tag, but tracked for filtering (RED_EYE in flag_bits)
+            flight_data['is_red_eye'] = True
         
         return tags
     
@@ -171,8 +260,7 @@ class DealsAgent:
             hotel_data['breakfast_included'] = True
         
         # Refundability
-        policy = hotel_data.get('cancellation_policy', '').lower()
-        if 'free' in policy or 'refund' in policy:
+        if is_refundable_policy(hotel_data.get('cancellation_policy')):
             tags.append(DealTag.REFUNDABLE)
         else:
             tags.append(DealTag.NON_REFUNDABLE)
@@ -337,20 +425,8 @@ class DealsAgent:
     # DATA PROCESSING
     # ==========================================
     
-    async def process_flight(self, flight_data: Dict[str, Any]) -> Optional[Flight]:
-        """Process a single flight, detect deal, tag, and save"""
-        # Detect deal
-        detection = self.detect_deal(
-            current_price=flight_data['price'],
-            avg_30d_price=flight_data.get('avg_30d_price'),
-            inventory=flight_data.get('seats_available', 100),
-            is_promo=flight_data.get('is_promo', False),
-            promo_end_days=random.randint(1, 7) if flight_data.get('is_promo') else 0
-        )
-        
-        if not detection.is_deal:
-            return None
-        
+    def _build_flight_record(self, flight_data: Dict[str, Any], detection: DealDetectionResult) -> Flight:
+        """Tag a detected flight deal and build its database record"""
         # Add deal detection tags
         tags = list(set(detection.tags + self.tag_flight(flight_data)))
         
@@ -369,8 +445,7 @@ class DealsAgent:
             datetime.utcnow() + timedelta(days=random.randint(1, 7)) if DealTag.PROMO in tags else None
         )
         
-        # Create database record
-        flight = Flight(
+        return Flight(
             deal_id=flight_data['deal_id'],
             origin=flight_data['origin'],
             destination=flight_data['destination'],
@@ -387,51 +462,15 @@ class DealsAgent:
             fare_class=flight_data.get('fare_class', 'Economy'),
             deal_score=detection.score.total_score,
             tags_json=json.dumps([t.value for t in tags]),
+            tag_bits=tags_to_bits(tags),
+            flag_bits=flight_flag_bits(flight_data['departure_time'], flight_data.get('fare_class', 'Economy')),
             why_this=why_this,
             what_to_watch=what_to_watch,
             expires_at=datetime.utcnow() + timedelta(days=random.randint(1, 7)) if DealTag.PROMO in tags else None
         )
-        
-        # Save to database
-        with Session(engine) as session:
-            # Check if exists
-            existing = session.exec(select(Flight).where(Flight.deal_id == flight.deal_id)).first()
-            if existing:
-                # Update
-                for key, value in flight.model_dump(exclude={'id'}).items():
-                    setattr(existing, key, value)
-                session.add(existing)
-            else:
-                session.add(flight)
-            session.commit()
-            session.refresh(flight if not existing else existing)
-        
-        # Emit event via WebSocket
-        if self.websocket_manager:
-            await self.websocket_manager.broadcast({
-                'type': 'new_deal',
-                'deal_type': 'flight',
-                'deal_id': flight.deal_id,
-                'score': detection.score.total_score,
-                'why_this': why_this
-            })
-        
-        return flight
     
-    async def process_hotel(self, hotel_data: Dict[str, Any]) -> Optional[Hotel]:
-        """Process a single hotel, detect deal, tag, and save"""
-        # Detect deal
-        detection = self.detect_deal(
-            current_price=hotel_data['price_per_night'],
-            avg_30d_price=hotel_data.get('avg_30d_price'),
-            inventory=hotel_data.get('rooms_available', 100),
-            is_promo=hotel_data.get('is_promo', False),
-            promo_end_days=random.randint(1, 7) if hotel_data.get('is_promo') else 0
-        )
-        
-        if not detection.is_deal:
-            return None
-        
+    def _build_hotel_record(self, hotel_data: Dict[str, Any], detection: DealDetectionResult) -> Hotel:
+        """Tag a detected hotel deal and build its database record"""
         # Add deal detection tags
         tags = list(set(detection.tags + self.tag_hotel(hotel_data)))
         
@@ -450,13 +489,14 @@ class DealsAgent:
             datetime.utcnow() + timedelta(days=random.randint(1, 7)) if DealTag.PROMO in tags else None
         )
         
-        # Create database record
-        hotel = Hotel(
+        return Hotel(
             deal_id=hotel_data['deal_id'],
             name=hotel_data['name'],
             city=hotel_data['city'],
+            city_key=city_key(hotel_data['city']),
             neighborhood=hotel_data['neighborhood'],
             stars=hotel_data.get('stars', 3),
+            metro_code=metro_for_city(hotel_data['city'], hotel_data['neighborhood']),
             price_per_night=hotel_data['price_per_night'],
             original_price=hotel_data.get('original_price', hotel_data['price_per_night']),
             avg_30d_price=hotel_data.get('avg_30d_price'),
@@ -467,65 +507,325 @@ class DealsAgent:
             pet_friendly=hotel_data.get('pet_friendly', False),
             breakfast_included=hotel_data.get('breakfast_included', False),
             near_transit=hotel_data.get('near_transit', False),
+            amenity_bits=amenities_to_bits(hotel_data.get('amenities', [])),
+            flag_bits=hotel_flag_bits(
+                hotel_data.get('pet_friendly', False),
+                hotel_data.get('breakfast_included', False),
+                hotel_data.get('near_transit', False),
+                hotel_data.get('cancellation_policy', 'Non-refundable')
+            ),
             deal_score=detection.score.total_score,
             tags_json=json.dumps([t.value for t in tags]),
+            tag_bits=tags_to_bits(tags),
             why_this=why_this,
             what_to_watch=what_to_watch,
             expires_at=datetime.utcnow() + timedelta(days=random.randint(1, 7)) if DealTag.PROMO in tags else None
         )
+    
+    def _detect_flight(self, flight_data: Dict[str, Any]) -> DealDetectionResult:
+        return self.detect_deal(
+            current_price=flight_data['price'],
+            avg_30d_price=flight_data.get('avg_30d_price'),
+            inventory=flight_data.get('seats_available', 100),
+            is_promo=flight_data.get('is_promo', False),
+            promo_end_days=random.randint(1, 7) if flight_data.get('is_promo') else 0
+        )
+    
+    def _detect_hotel(self, hotel_data: Dict[str, Any]) -> DealDetectionResult:
+        return self.detect_deal(
+            current_price=hotel_data['price_per_night'],
+            avg_30d_price=hotel_data.get('avg_30d_price'),
+            inventory=hotel_data.get('rooms_available', 100),
+            is_promo=hotel_data.get('is_promo', False),
+            promo_end_days=random.randint(1, 7) if hotel_data.get('is_promo') else 0
+        )
+    
+    def _deal_event(self, deal_type: str, record, score: int) -> Dict[str, Any]:
+        return {
+            'type': 'new_deal',
+            'deal_type': deal_type,
+            'deal_id': record.deal_id,
+            'score': score,
+            'why_this': record.why_this
+        }
+    
+    async def _emit_new_deal(self, deal_type: str, record, score: int):
+        """Emit a new deal event via WebSocket"""
+        if self.websocket_manager:
+            await self.websocket_manager.broadcast(self._deal_event(deal_type, record, score))
+    
+    async def _fire_watches(self, deal_type: str, records: List[Any]):
+        """Evaluate watches on updated deals and push events for crossed thresholds"""
+        if not self.watch_index:
+            return
+        
+        price_key, inventory_key = self.PRICE_INVENTORY_KEYS[deal_type]
+        events = []
+        for record in records:
+            if record.deal_id in self.watch_index:
+                events.extend(self.watch_index.evaluate(
+                    record.deal_id, deal_type,
+                    getattr(record, price_key), getattr(record, inventory_key)
+                ))
+        
+        if not events:
+            return
+        
+        await self._run_in_db(self._mark_watches_notified, [e.watch_id for e in events])
+        if self.websocket_manager:
+            for event in events:
+                await self.websocket_manager.broadcast_watch_event(event.watch_id, {
+                    'type': 'watch_event',
+                    **event.model_dump(mode='json')
+                })
+    
+    def _mark_watches_notified(self, watch_ids: List[str]):
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(
+                update(Watch.__table__)
+                .where(Watch.__table__.c.watch_id.in_(watch_ids))
+                .values(last_notified=now, last_checked=now)
+            )
+    
+    def _apply_price_history(self, deal_type: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replace feed-provided 30-day averages with averages from recorded
+        price history, drop rows unchanged since the last scan, then record
+        the prices observed in this batch. Returns the new or changed rows.
+        
+        Averages are applied first so a listing whose history average moved
+        is re-scored. Unchanged rows still count towards the day buckets,
+        or steady prices would drop out of their own average.
+        """
+        price_key, _ = self.PRICE_INVENTORY_KEYS[deal_type]
+        
+        averages = rolling_averages(r['deal_id'] for r in rows)
+        for row in rows:
+            avg = averages.get(row['deal_id'])
+            if avg is not None:
+                row['avg_30d_price'] = round(avg, 2)
+        
+        changed_rows = self._filter_changed(deal_type, rows)
+        changed = {id(row) for row in changed_rows}
+        record_prices(
+            ((r['deal_id'], deal_type, r[price_key]) for r in changed_rows),
+            aggregate_only=((r['deal_id'], deal_type, r[price_key]) for r in rows if id(r) not in changed)
+        )
+        return changed_rows
+    
+    async def process_flight(self, flight_data: Dict[str, Any]) -> Optional[Flight]:
+        """Process a single flight that passed _apply_price_history: detect deal, tag, and save"""
+        detection = self._detect_flight(flight_data)
+        if not detection.is_deal:
+            return None
         
-        # Save to database
-        with Session(engine) as session:
-            existing = session.exec(select(Hotel).where(Hotel.deal_id == hotel.deal_id)).first()
-            if existing:
-                for key, value in hotel.model_dump(exclude={'id'}).items():
-                    setattr(existing, key, value)
-                session.add(existing)
-            else:
-                session.add(hotel)
-            session.commit()
-            session.refresh(hotel if not existing else existing)
+        flight = self._build_flight_record(flight_data, detection)
+        await self._run_in_db(self._persist, Flight, [flight])
+        await self._fire_watches('flight', [flight])
         
-        # Emit event
-        if self.websocket_manager:
-            await self.websocket_manager.broadcast({
-                'type': 'new_deal',
-                'deal_type': 'hotel',
-                'deal_id': hotel.deal_id,
-                'score': detection.score.total_score,
-                'why_this': why_this
-            })
+        await self._emit_new_deal('flight', flight, detection.score.total_score)
+        return flight
+    
+    async def process_hotel(self, hotel_data: Dict[str, Any]) -> Optional[Hotel]:
+        """Process a single hotel that passed _apply_price_history: detect deal, tag, and save"""
+        detection = self._detect_hotel(hotel_data)
+        if not detection.is_deal:
+            return None
+        
+        hotel = self._build_hotel_record(hotel_data, detection)
+        await self._run_in_db(self._persist, Hotel, [hotel])
+        await self._fire_watches('hotel', [hotel])
         
+        await self._emit_new_deal('hotel', hotel, detection.score.total_score)
         return hotel
     
+    # ==========================================
+    # CHANGE DETECTION
+    # ==========================================
+    
+    # Every input field that detection or _build_*_record reads; avg_30d_price
+    # is the history average by the time rows are fingerprinted
+    FINGERPRINT_FIELDS = {
+        'flight': ('origin', 'destination', 'airline', 'departure_time', 'arrival_time',
+                   'duration_minutes', 'stops', 'price', 'original_price', 'avg_30d_price',
+                   'seats_available', 'fare_class', 'is_promo'),
+        'hotel': ('name', 'city', 'neighborhood', 'stars', 'price_per_night', 'original_price',
+                  'avg_30d_price', 'rooms_available', 'amenities', 'cancellation_policy',
+                  'pet_friendly', 'breakfast_included', 'near_transit', 'is_promo'),
+    }
+    
+    def fingerprint(self, deal_type: str, row: Dict[str, Any]) -> int:
+        """Compact 64-bit hash of the fields that matter for a listing"""
+        values = tuple(
+            tuple(v) if isinstance(v, list) else v
+            for v in (row.get(f) for f in self.FINGERPRINT_FIELDS[deal_type])
+        )
+        digest = hashlib.blake2b(repr(values).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+    
+    def _filter_changed(self, deal_type: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop rows whose fingerprint matches the last scan.
+        Every row's fingerprint is staged and only committed once the scan succeeds.
+        """
+        changed_rows = []
+        for row in rows:
+            fp = self.fingerprint(deal_type, row)
+            previous = self._fingerprints.get(row['deal_id'])
+            self._pending_fingerprints[row['deal_id']] = fp
+            if previous == fp:
+                self._scan_changes['skipped'] += 1
+                continue
+            
+            self._scan_changes['new' if previous is None else 'changed'] += 1
+            changed_rows.append(row)
+        
+        self._scan_changes['processed'] += len(changed_rows)
+        return changed_rows
+    
+    def _reset_scan_changes(self):
+        self._scan_changes = {'processed': 0, 'skipped': 0, 'changed': 0, 'new': 0}
+        self._pending_fingerprints = {}
+    
+    # ==========================================
+    # SCAN PIPELINE
+    # ==========================================
+    
+    async def _run_in_db(self, fn, *args):
+        """Run blocking database work on the dedicated DB executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, functools.partial(fn, *args))
+    
+    async def _diff_stage(self, batch: ScanBatch) -> Optional[ScanBatch]:
+        batch.rows = await self._run_in_db(self._apply_price_history, batch.deal_type, batch.rows)
+        return batch if batch.rows else None
+    
+    async def _detect_stage(self, batch: ScanBatch) -> Optional[ScanBatch]:
+        batch.detections = await asyncio.to_thread(
+            lambda: list(self._batch_detections(batch.deal_type, batch.rows))
+        )
+        return batch if batch.detections else None
+    
+    async def _tag_stage(self, batch: ScanBatch) -> Optional[ScanBatch]:
+        build = self._build_flight_record if batch.deal_type == 'flight' else self._build_hotel_record
+        batch.records = await asyncio.to_thread(
+            lambda: [build(row, detection) for row, detection in batch.detections]
+        )
+        return batch
+    
+    async def _persist_stage(self, batch: ScanBatch) -> Optional[ScanBatch]:
+        model = Flight if batch.deal_type == 'flight' else Hotel
+        await self._run_in_db(self._persist, model, batch.records)
+        self._scan_deals[batch.deal_type] += len(batch.records)
+        return batch
+    
+    async def _emit_stage(self, batch: ScanBatch) -> Optional[ScanBatch]:
+        await self._fire_watches(batch.deal_type, batch.records)
+        if self._event_batcher:
+            for record in batch.records:
+                await self._event_batcher.add(self._deal_event(batch.deal_type, record, record.deal_score))
+        return batch
+    
+    def _build_pipeline(self) -> ScanPipeline:
+        return ScanPipeline([
+            ('diff', self._diff_stage),
+            ('detect', self._detect_stage),
+            ('tag', self._tag_stage),
+            ('persist', self._persist_stage),
+            ('emit', self._emit_stage),
+        ])
+    
+    def _persist(self, model, records: List[Any]) -> int:
+        """Bulk upsert records and account the write time"""
+        started = time.perf_counter()
+        written = bulk_upsert(model, [r.model_dump(exclude={'id'}) for r in records])
+        self._rows_written += written
+        self._persist_seconds += time.perf_counter() - started
+        return written
+    
+    def pipeline_stats(self) -> List[Dict[str, Any]]:
+        """Per-stage throughput and queue depth of the current or last scan"""
+        if not self.pipeline:
+            return []
+        return [stats.to_dict() for stats in self.pipeline.stats]
+    
     # ==========================================
     # SCHEDULED JOBS
     # ==========================================
     
     async def run_feed_scan(self):
         """Scheduled job to scan feeds and process deals"""
+        async with self._scan_lock:
+            try:
+                return await self._run_feed_scan()
+            finally:
+                # Publish a fresh read model (and generation) for bundle search,
+                # including rows written by a scan that failed part-way
+                if self.deal_index:
+                    await self._run_in_db(self.deal_index.refresh)
+    
+    async def _run_feed_scan(self):
         print(f"[DealsAgent] Starting feed scan at {datetime.utcnow()}")
-        
-        # Generate mock data for demo
-        flights = self.generate_mock_flights(50)
-        hotels = self.generate_mock_hotels(50)
-        
-        flight_deals = 0
-        hotel_deals = 0
-        
-        for flight in flights:
-            result = await self.process_flight(flight)
-            if result:
-                flight_deals += 1
-        
-        for hotel in hotels:
-            result = await self.process_hotel(hotel)
-            if result:
-                hotel_deals += 1
+        started = time.perf_counter()
+        
+        self._scan_deals = {'flight': 0, 'hotel': 0}
+        self._rows_written = 0
+        self._persist_seconds = 0.0
+        self._reset_scan_changes()
+        
+        if self.bulk_persist:
+            # Coalesce new-deal events into deals_batch frames for the whole scan
+            if self.websocket_manager:
+                self._event_batcher = DealEventBatcher(self.websocket_manager)
+                self._event_batcher.start()
+            self.pipeline = self._build_pipeline()
+            try:
+                await self.pipeline.run([(source.deal_type, source) for source in self.feed_sources])
+            finally:
+                if self._event_batcher:
+                    await self._event_batcher.close()
+                    self._event_batcher = None
+        else:
+            for source in self.feed_sources:
+                process = self.process_flight if source.deal_type == 'flight' else self.process_hotel
+                for row in source:
+                    changed = await self._run_in_db(self._apply_price_history, source.deal_type, [row])
+                    if changed and await process(row):
+                        self._scan_deals[source.deal_type] += 1
+        
+        # Only remember fingerprints of listings from a scan that completed;
+        # listings the feed no longer lists are forgotten
+        self._fingerprints = self._pending_fingerprints
+        self._pending_fingerprints = {}
+        
+        flight_deals = self._scan_deals['flight']
+        hotel_deals = self._scan_deals['hotel']
+        rows_per_sec = self._rows_written / self._persist_seconds if self._persist_seconds > 0 else 0.0
+        duration = time.perf_counter() - started
         
         print(f"[DealsAgent] Scan complete. Found {flight_deals} flight deals, {hotel_deals} hotel deals")
-        
-        return {'flight_deals': flight_deals, 'hotel_deals': hotel_deals}
+        self._record_scan_metrics(duration)
+        
+        return {
+            'flight_deals': flight_deals,
+            'hotel_deals': hotel_deals,
+            'rows_written': self._rows_written,
+            'persist_rows_per_sec': round(rows_per_sec, 1),
+            **self._scan_changes,
+            'duration_seconds': round(duration, 3),
+            'stages': self.pipeline_stats() if self.bulk_persist else []
+        }
+    
+    def _record_scan_metrics(self, duration: float):
+        """Export a completed scan to the /metrics registry"""
+        metrics.scan_duration.observe(duration)
+        for deal_type, count in self._scan_deals.items():
+            metrics.deals_found.observe(count, deal_type)
+        if self.bulk_persist and self.pipeline:
+            for stage in self.pipeline.stats:
+                metrics.scan_stage_seconds.inc(stage.name, amount=stage.busy_seconds)
+                metrics.scan_stage_items.inc(stage.name, amount=stage.items)
     
     async def start(self, interval_seconds: int = 300):
         """Start the deals agent background worker"""
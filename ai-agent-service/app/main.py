@@ -9,20 +9,37 @@ Multi-agent travel concierge that:
 FastAPI + Pydantic v2 + SQLModel + Kafka
 """
 import asyncio
+import json
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from typing import Awaitable, Callable, Optional
 from datetime import datetime
+from email.utils import format_datetime
 
 from app.models.schemas import (
-    BundleRequest, BundleResponse, ChatRequest, ChatResponse,
-    WatchRequest, WatchEvent
+    BundleRequest, BundleResponse, BundleBatchRequest, BundleBatchResponse,
+    ChatRequest, ChatResponse, WatchRequest, WatchEvent, DealTag, DealType
+)
+from app.models.database import create_db_and_tables, async_engine, backfill_deal_bits
+from app.models.deal_bits import (
+    TAG_BITS, PET_FRIENDLY, BREAKFAST_INCLUDED, NEAR_TRANSIT, REFUNDABLE, RED_EYE,
+    amenity_bit, bit_predicates, has_bits
 )
-from app.models.database import create_db_and_tables
 from app.agents.deals_agent import DealsAgent
 from app.agents.concierge_agent import ConciergeAgent
 from app.services.websocket_manager import manager
+from app.services.watch_index import watch_index
+from app.services.deal_index import deal_index
+from app.services.result_cache import bundle_cache, deals_response_cache
+from app.services.session_store import session_store
+from app.services.metro_codes import backfill_metro_codes
+from app.services.city_search import backfill_city_keys, resolve_city_keys
+from app.services.pagination import EXPORT_BATCH_SIZE, decode_cursor, fetch_keyset_page, split_page
+from app.services.feed_sources import simple_backend_sources
+from app.services.metrics import registry, MetricsMiddleware, instrument_db_sessions
 
 
 # Global agent instances
@@ -40,11 +57,33 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     create_db_and_tables()
+    instrument_db_sessions()
+    backfill_metro_codes()
+    backfill_city_keys()
+    backfill_deal_bits()
     print("✅ Database initialized")
     
+    # Load active watches into the threshold index
+    watch_index.rebuild()
+    
+    # Feed sources: simple-backend JSON files when DEALS_FEED_DIR is set, mock data otherwise
+    feed_dir = os.getenv("DEALS_FEED_DIR")
+    feed_sources = simple_backend_sources(feed_dir) if feed_dir else None
+    
     # Initialize agents
-    deals_agent = DealsAgent(websocket_manager=manager)
-    concierge_agent = ConciergeAgent(websocket_manager=manager)
+    deals_agent = DealsAgent(
+        websocket_manager=manager,
+        watch_index=watch_index,
+        deal_index=deal_index,
+        feed_sources=feed_sources
+    )
+    concierge_agent = ConciergeAgent(
+        websocket_manager=manager,
+        watch_index=watch_index,
+        deal_index=deal_index,
+        bundle_cache=bundle_cache,
+        session_store=session_store
+    )
     print("✅ Agents initialized")
     
     # Run initial data scan
@@ -54,6 +93,9 @@ async def lifespan(app: FastAPI):
     # Start background deals scanner (every 5 minutes)
     scan_task = asyncio.create_task(deals_agent.start(interval_seconds=300))
     
+    # Write dirty chat sessions back to SQLite in batches
+    session_flush_task = asyncio.create_task(session_store.start(interval_seconds=2.0))
+    
     print("=" * 50)
     print("🎯 Kayak AI Agent Service Ready!")
     print("=" * 50)
@@ -63,11 +105,18 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Shutting down AI Agent Service...")
     deals_agent.stop()
-    scan_task.cancel()
-    try:
-        await scan_task
-    except asyncio.CancelledError:
-        pass
+    session_store.stop()
+    for task in (scan_task, session_flush_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    # Persist chat sessions changed since the last interval flush
+    flushed = session_store.flush()
+    print(f"💾 Flushed {flushed} chat sessions")
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -86,6 +135,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Live WebSocket state, read when /metrics is scraped
+registry.gauge(
+    'kayak_ai_websocket_connections', 'Open WebSocket connections',
+    callback=lambda: {(): manager.connection_count}
+)
+registry.gauge(
+    'kayak_ai_websocket_subscriptions', 'WebSocket subscribers by channel', ('channel',),
+    callback=lambda: {(channel,): count for channel, count in manager.subscription_counts().items()}
+)
+registry.gauge(
+    'kayak_ai_deals_cache_lookups', 'Deals endpoint response cache lookups by outcome', ('outcome',),
+    callback=lambda: {
+        ('hit',): deals_response_cache.hits,
+        ('miss',): deals_response_cache.misses,
+        ('not_modified',): deals_response_cache.not_modified,
+    }
+)
+
 
 # ==========================================
 # HEALTH & STATUS
@@ -105,6 +175,7 @@ async def health_check():
 @app.get("/status")
 async def service_status():
     """Detailed service status"""
+    snapshot = deal_index.current
     return {
         "service": "kayak-ai-agent",
         "version": "1.0.0",
@@ -112,25 +183,32 @@ async def service_status():
             "deals_agent": "running" if deals_agent and deals_agent._running else "stopped",
             "concierge_agent": "ready" if concierge_agent else "not_initialized"
         },
+        "scan_pipeline": deals_agent.pipeline_stats() if deals_agent else [],
+        "deal_index": {
+            "generation": deal_index.generation,
+            "flights": snapshot.flight_count,
+            "hotels": snapshot.hotel_count
+        },
+        "bundle_cache": bundle_cache.stats(),
+        "deals_cache": deals_response_cache.stats(),
+        "chat_sessions": session_store.stats(),
         "connections": manager.connection_count,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # ==========================================
 # BUNDLES API (HTTP)
 # ==========================================
 
-@app.post("/bundles", response_model=BundleResponse)
-async def find_bundles(request: BundleRequest):
-    """
-    Find travel bundles matching user criteria.
-    
-    Returns flight + hotel combinations sorted by fit score.
-    """
-    if not concierge_agent:
-        raise HTTPException(status_code=503, detail="Service not ready")
-    
+def bundle_intent(request: BundleRequest) -> dict:
+    """Search intent for a BundleRequest"""
     intent = {
         'origin': request.origin,
         'destination': request.destination,
@@ -152,9 +230,10 @@ async def find_bundles(request: BundleRequest):
         for key, value in parsed.items():
             if key not in intent or intent[key] is None:
                 intent[key] = value
-    
-    bundles = concierge_agent.find_bundles(intent, limit=5)
-    
+    return intent
+
+
+def bundle_response(request: BundleRequest, bundles) -> BundleResponse:
     # Build constraints list for response
     constraints = []
     if request.pet_friendly:
@@ -177,6 +256,42 @@ async def find_bundles(request: BundleRequest):
     )
 
 
+@app.post("/bundles", response_model=BundleResponse)
+async def find_bundles(request: BundleRequest):
+    """
+    Find travel bundles matching user criteria.
+    
+    Returns flight + hotel combinations sorted by fit score.
+    """
+    if not concierge_agent:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    
+    intent = bundle_intent(request)
+    snapshot = await concierge_agent.bundle_snapshot(intent)
+    bundles = concierge_agent.find_bundles(intent, limit=5, snapshot=snapshot)
+    return bundle_response(request, bundles)
+
+
+@app.post("/bundles/batch", response_model=BundleBatchResponse)
+async def find_bundles_batch(batch: BundleBatchRequest):
+    """
+    Run several bundle searches in one call.
+    
+    Every search sees the same deal snapshot, and searches from the same
+    origin share flight retrieval. Results are in request order.
+    """
+    if not concierge_agent:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    
+    intents = [bundle_intent(request) for request in batch.requests]
+    snapshot = await concierge_agent.bundle_snapshot()
+    results = concierge_agent.find_bundles_batch(intents, limit=5, snapshot=snapshot)
+    return BundleBatchResponse(
+        results=[bundle_response(request, bundles) for request, bundles in zip(batch.requests, results)],
+        snapshot_generation=snapshot.generation
+    )
+
+
 @app.get("/bundles/{bundle_id}")
 async def get_bundle(bundle_id: str):
     """Get specific bundle details"""
@@ -211,14 +326,13 @@ async def create_watch(request: WatchRequest):
     if not concierge_agent:
         raise HTTPException(status_code=503, detail="Service not ready")
     
-    # Simplified - in full implementation would use database
-    from app.models.database import Watch, engine
-    from sqlmodel import Session
+    from app.models.database import Watch, Flight, Hotel, async_session_factory
+    from sqlmodel import select
     import uuid
     
     watch_id = f"watch-{uuid.uuid4().hex[:8]}"
     
-    with Session(engine) as session:
+    async with async_session_factory() as session:
         watch = Watch(
             watch_id=watch_id,
             user_id=request.user_id,
@@ -230,7 +344,20 @@ async def create_watch(request: WatchRequest):
             notify_via=request.notify_via
         )
         session.add(watch)
-        session.commit()
+        await session.commit()
+        await session.refresh(watch)
+        
+        # Index the watch with the deal's current state as its baseline
+        price, inventory = None, None
+        if watch.deal_type == 'flight':
+            deal = (await session.exec(select(Flight).where(Flight.deal_id == watch.deal_id))).first()
+            if deal:
+                price, inventory = deal.price, deal.seats_available
+        elif watch.deal_type == 'hotel':
+            deal = (await session.exec(select(Hotel).where(Hotel.deal_id == watch.deal_id))).first()
+            if deal:
+                price, inventory = deal.price_per_night, deal.rooms_available
+        watch_index.add(watch, price, inventory)
     
     return {
         "watch_id": watch_id,
@@ -245,13 +372,13 @@ async def create_watch(request: WatchRequest):
 @app.get("/watches/{user_id}")
 async def get_user_watches(user_id: str):
     """Get all watches for a user"""
-    from app.models.database import Watch, engine
-    from sqlmodel import Session, select
+    from app.models.database import Watch, async_session_factory
+    from sqlmodel import select
     
-    with Session(engine) as session:
-        watches = session.exec(
+    async with async_session_factory() as session:
+        watches = (await session.exec(
             select(Watch).where(Watch.user_id == user_id, Watch.is_active == True)
-        ).all()
+        )).all()
         
         return {
             "user_id": user_id,
@@ -272,18 +399,19 @@ async def get_user_watches(user_id: str):
 @app.delete("/watches/{watch_id}")
 async def delete_watch(watch_id: str):
     """Delete/deactivate a watch"""
-    from app.models.database import Watch, engine
-    from sqlmodel import Session, select
+    from app.models.database import Watch, async_session_factory
+    from sqlmodel import select
     
-    with Session(engine) as session:
-        watch = session.exec(select(Watch).where(Watch.watch_id == watch_id)).first()
+    async with async_session_factory() as session:
+        watch = (await session.exec(select(Watch).where(Watch.watch_id == watch_id))).first()
         if not watch:
             raise HTTPException(status_code=404, detail="Watch not found")
         
         watch.is_active = False
         session.add(watch)
-        session.commit()
+        await session.commit()
     
+    watch_index.remove(watch_id)
     return {"message": "Watch deleted"}
 
 
@@ -291,90 +419,216 @@ async def delete_watch(watch_id: str):
 # DEALS API
 # ==========================================
 
+def flight_deal_json(f) -> dict:
+    return {
+        "deal_id": f.deal_id,
+        "origin": f.origin,
+        "destination": f.destination,
+        "airline": f.airline,
+        "price": f.price,
+        "original_price": f.original_price,
+        "discount_percent": f.discount_percent,
+        "deal_score": f.deal_score,
+        "seats_available": f.seats_available,
+        "departure_time": f.departure_time.isoformat() if f.departure_time else None,
+        "why_this": f.why_this,
+        "what_to_watch": f.what_to_watch
+    }
+
+
+def hotel_deal_json(h) -> dict:
+    return {
+        "deal_id": h.deal_id,
+        "name": h.name,
+        "city": h.city,
+        "neighborhood": h.neighborhood,
+        "stars": h.stars,
+        "price_per_night": h.price_per_night,
+        "original_price": h.original_price,
+        "discount_percent": h.discount_percent,
+        "deal_score": h.deal_score,
+        "rooms_available": h.rooms_available,
+        "pet_friendly": h.pet_friendly,
+        "breakfast_included": h.breakfast_included,
+        "why_this": h.why_this,
+        "what_to_watch": h.what_to_watch
+    }
+
+
+def parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def cached_deals_response(request: Request, load: Callable[[], Awaitable[dict]]) -> Response:
+    """
+    Serve a /deals/* payload from deals_response_cache, keyed by path and
+    query and tagged with the deal index generation, so it is rebuilt at
+    most once per scan. A matching If-None-Match or If-Modified-Since
+    gets a 304 without touching SQLite.
+    """
+    generation = deal_index.generation
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    cached = deals_response_cache.get(key, generation)
+    if cached is None:
+        cached = deals_response_cache.store(
+            key, generation, JSONResponse(await load()).body, deal_index.published_at
+        )
+    
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if cached.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(cached.last_modified, usegmt=True)
+    if deals_response_cache.is_not_modified(
+        cached, request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
 @app.get("/deals/flights")
 async def get_flight_deals(
+    request: Request,
     origin: Optional[str] = Query(None),
     destination: Optional[str] = Query(None),
-    limit: int = Query(10, ge=1, le=50)
+    refundable: Optional[bool] = Query(None),
+    red_eye: Optional[bool] = Query(None),
+    tag: Optional[DealTag] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None)
 ):
-    """Get current flight deals"""
-    from app.models.database import Flight, engine
-    from sqlmodel import Session, select
+    """Get current flight deals, best first; pass next_cursor back as cursor for the next page"""
+    from app.models.database import Flight, async_session_factory
+    from sqlmodel import select
     
-    with Session(engine) as session:
-        query = select(Flight).where(Flight.is_active == True)
-        
-        if origin:
-            query = query.where(Flight.origin == origin.upper())
-        if destination:
-            query = query.where(Flight.destination == destination.upper())
-        
-        flights = session.exec(query.order_by(Flight.deal_score.desc()).limit(limit)).all()
-        
-        return {
-            "deals": [
-                {
-                    "deal_id": f.deal_id,
-                    "origin": f.origin,
-                    "destination": f.destination,
-                    "airline": f.airline,
-                    "price": f.price,
-                    "original_price": f.original_price,
-                    "discount_percent": f.discount_percent,
-                    "deal_score": f.deal_score,
-                    "seats_available": f.seats_available,
-                    "departure_time": f.departure_time.isoformat() if f.departure_time else None,
-                    "why_this": f.why_this,
-                    "what_to_watch": f.what_to_watch
-                }
-                for f in flights
-            ],
-            "count": len(flights)
-        }
+    after = parse_cursor(cursor)
+    
+    async def load() -> dict:
+        async with async_session_factory() as session:
+            query = select(Flight).where(Flight.is_active == True)
+            
+            if origin:
+                query = query.where(Flight.origin == origin.upper())
+            if destination:
+                query = query.where(Flight.destination == destination.upper())
+            # Constraint filters are bitwise predicates evaluated by SQLite
+            query = query.where(*bit_predicates(Flight.flag_bits, {REFUNDABLE: refundable, RED_EYE: red_eye}))
+            if tag:
+                query = query.where(has_bits(Flight.tag_bits, TAG_BITS[tag]))
+            
+            rows = await fetch_keyset_page(session, query, Flight, after, limit)
+            flights, next_cursor = split_page(rows, limit)
+            
+            return {
+                "deals": [flight_deal_json(f) for f in flights],
+                "count": len(flights),
+                "next_cursor": next_cursor
+            }
+    
+    return await cached_deals_response(request, load)
 
 
 @app.get("/deals/hotels")
 async def get_hotel_deals(
+    request: Request,
     city: Optional[str] = Query(None),
     pet_friendly: Optional[bool] = Query(None),
-    limit: int = Query(10, ge=1, le=50)
+    breakfast_included: Optional[bool] = Query(None),
+    near_transit: Optional[bool] = Query(None),
+    refundable: Optional[bool] = Query(None),
+    amenity: Optional[str] = Query(None),
+    tag: Optional[DealTag] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None)
 ):
-    """Get current hotel deals"""
-    from app.models.database import Hotel, engine
-    from sqlmodel import Session, select
+    """Get current hotel deals, best first; pass next_cursor back as cursor for the next page"""
+    from app.models.database import Hotel, async_session_factory
+    from sqlmodel import select
     
-    with Session(engine) as session:
-        query = select(Hotel).where(Hotel.is_active == True)
-        
-        if city:
-            query = query.where(Hotel.city.ilike(f"%{city}%"))
-        if pet_friendly is not None:
-            query = query.where(Hotel.pet_friendly == pet_friendly)
-        
-        hotels = session.exec(query.order_by(Hotel.deal_score.desc()).limit(limit)).all()
-        
-        return {
-            "deals": [
-                {
-                    "deal_id": h.deal_id,
-                    "name": h.name,
-                    "city": h.city,
-                    "neighborhood": h.neighborhood,
-                    "stars": h.stars,
-                    "price_per_night": h.price_per_night,
-                    "original_price": h.original_price,
-                    "discount_percent": h.discount_percent,
-                    "deal_score": h.deal_score,
-                    "rooms_available": h.rooms_available,
-                    "pet_friendly": h.pet_friendly,
-                    "breakfast_included": h.breakfast_included,
-                    "why_this": h.why_this,
-                    "what_to_watch": h.what_to_watch
-                }
-                for h in hotels
-            ],
-            "count": len(hotels)
-        }
+    after = parse_cursor(cursor)
+    amenity_mask = None
+    if amenity:
+        amenity_mask = amenity_bit(amenity)
+        if amenity_mask is None:
+            raise HTTPException(status_code=400, detail=f"Unknown amenity: {amenity}")
+    
+    async def load() -> dict:
+        async with async_session_factory() as session:
+            query = select(Hotel).where(Hotel.is_active == True)
+            
+            city_keys = None
+            if city:
+                # Resolved to city keys on the small hotelcity indexes, then an IN on
+                # ix_hotel_city_score; no matching key means no hotels, without a query
+                city_keys = await resolve_city_keys(session, city)
+                if not city_keys:
+                    return {"deals": [], "count": 0, "next_cursor": None}
+                query = query.where(Hotel.city_key.in_(city_keys))
+            # Constraint filters are bitwise predicates evaluated by SQLite
+            query = query.where(*bit_predicates(Hotel.flag_bits, {
+                PET_FRIENDLY: pet_friendly,
+                BREAKFAST_INCLUDED: breakfast_included,
+                NEAR_TRANSIT: near_transit,
+                REFUNDABLE: refundable,
+            }))
+            if amenity_mask is not None:
+                query = query.where(has_bits(Hotel.amenity_bits, amenity_mask))
+            if tag:
+                query = query.where(has_bits(Hotel.tag_bits, TAG_BITS[tag]))
+            
+            rows = await fetch_keyset_page(
+                session, query, Hotel, after, limit,
+                order_from_index=city_keys is None or len(city_keys) == 1
+            )
+            hotels, next_cursor = split_page(rows, limit)
+            
+            return {
+                "deals": [hotel_deal_json(h) for h in hotels],
+                "count": len(hotels),
+                "next_cursor": next_cursor
+            }
+    
+    return await cached_deals_response(request, load)
+
+
+@app.get("/deals/export")
+async def export_deals(deal_type: Optional[DealType] = Query(None)):
+    """
+    Every active deal as NDJSON, one {"type": ..., "deal": ...} object per
+    line, best deal_score first. Rows are read in keyset batches, each in
+    its own short session, so memory stays constant and no read
+    transaction is held open while the client consumes the stream.
+    """
+    from app.models.database import Flight, Hotel, async_session_factory
+    from sqlmodel import select
+    
+    sources = [
+        (DealType.FLIGHT, Flight, flight_deal_json),
+        (DealType.HOTEL, Hotel, hotel_deal_json),
+    ]
+    
+    async def lines():
+        for kind, model, to_json in sources:
+            if deal_type is not None and kind != deal_type:
+                continue
+            after = None
+            while True:
+                async with async_session_factory() as session:
+                    query = select(model).where(model.is_active == True)
+                    rows = await fetch_keyset_page(session, query, model, after, EXPORT_BATCH_SIZE)
+                batch = rows[:EXPORT_BATCH_SIZE]
+                if batch:
+                    yield "".join(
+                        json.dumps({"type": kind.value, "deal": to_json(row)}) + "\n" for row in batch
+                    )
+                if len(rows) <= EXPORT_BATCH_SIZE:
+                    break
+                after = (batch[-1].deal_score, batch[-1].id)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 # ==========================================
@@ -390,6 +644,8 @@ async def websocket_events(websocket: WebSocket, session_id: Optional[str] = Non
     - New deal notifications
     - Watch alerts
     - Price changes
+    - Chat responses; {type: 'chat', stream: true} streams bundle_partial
+      frames before the final chat_response
     """
     await manager.connect(websocket, session_id)
     
@@ -401,12 +657,14 @@ async def websocket_events(websocket: WebSocket, session_id: Optional[str] = Non
             message_type = data.get('type')
             
             if message_type == 'subscribe_deals':
-                # Subscribe to deal updates
+                # Subscribe to deal updates ('per_event' or 'batched' delivery)
                 deal_type = data.get('deal_type', 'all')
-                manager.subscribe_to_deals(websocket, deal_type)
+                delivery = data.get('delivery', 'per_event')
+                manager.subscribe_to_deals(websocket, deal_type, delivery)
                 await websocket.send_json({
                     'type': 'subscribed',
-                    'subscription': f'deals:{deal_type}'
+                    'subscription': f'deals:{deal_type}',
+                    'delivery': delivery
                 })
             
             elif message_type == 'subscribe_watch':
@@ -426,11 +684,16 @@ async def websocket_events(websocket: WebSocket, session_id: Optional[str] = Non
                         message=data.get('message', ''),
                         session_id=session_id
                     )
-                    response = await concierge_agent.handle_message(request)
-                    await websocket.send_json({
-                        'type': 'chat_response',
-                        'data': response.model_dump()
-                    })
+                    if data.get('stream'):
+                        # chat_ack, then bundle_partial frames, then chat_response
+                        async for frame in concierge_agent.stream_message(request):
+                            await websocket.send_json(frame)
+                    else:
+                        response = await concierge_agent.handle_message(request)
+                        await websocket.send_json({
+                            'type': 'chat_response',
+                            'data': response.model_dump(mode='json')
+                        })
             
             elif message_type == 'ping':
                 await websocket.send_json({'type': 'pong'})
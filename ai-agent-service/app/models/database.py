@@ -1,27 +1,147 @@
 """
 SQLModel Database Models for persistent storage
 """
-from sqlmodel import SQLModel, Field, create_engine, Session, Relationship
-from typing import Optional, List
-from datetime import datetime
+from sqlmodel import SQLModel, Field, create_engine, Session, Relationship, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Index, UniqueConstraint
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from typing import Optional, List, Dict, Any, Type, AsyncIterator
+from datetime import datetime, date
 import json
+import os
+
+from app.models.deal_bits import (
+    amenities_to_bits, flight_flag_bits, hotel_flag_bits, json_list,
+    tag_values_from_bits, tags_to_bits
+)
 
 
 # ==========================================
 # DATABASE SETUP
 # ==========================================
 
-DATABASE_URL = "sqlite:///./data/kayak_ai.db"
+DATABASE_PATH = os.getenv("KAYAK_AI_DB_PATH", "./data/kayak_ai.db")
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 engine = create_engine(DATABASE_URL, echo=False)
 
+# Same database through aiosqlite, for queries made on the event loop
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 
 def get_session():
     with Session(engine) as session:
         yield session
 
 
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with async_session_factory() as session:
+        yield session
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
+    _create_city_search()
+
+
+def _add_missing_columns():
+    """
+    create_all() doesn't alter existing tables, so add nullable columns
+    and indexes introduced after a database file was first created.
+    """
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                ddl_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl_type}')
+                if column.index:
+                    conn.exec_driver_sql(
+                        f'CREATE INDEX IF NOT EXISTS "ix_{table.name}_{column.name}" '
+                        f'ON "{table.name}" ("{column.name}")'
+                    )
+            # Composite indexes declared in __table_args__
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+# Trigram full-text index over distinct hotel city keys, fed by triggers so
+# every writer (ORM, bulk_upsert, backfills) keeps it current. The hotel
+# triggers skip known keys with NOT EXISTS: a bulk_upsert taking its DO
+# UPDATE path runs them under its own ABORT, which overrides OR IGNORE.
+CITY_SEARCH_DDL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS hotelcity_fts USING fts5('
+    'city_key, content="hotelcity", content_rowid="id", tokenize="trigram")',
+    'CREATE TRIGGER IF NOT EXISTS hotelcity_fts_insert AFTER INSERT ON hotelcity BEGIN '
+    'INSERT INTO hotelcity_fts(rowid, city_key) VALUES (NEW.id, NEW.city_key); END',
+    # Replace triggers created with INSERT OR IGNORE by earlier versions
+    'DROP TRIGGER IF EXISTS hotel_city_key_insert',
+    'DROP TRIGGER IF EXISTS hotel_city_key_update',
+    'CREATE TRIGGER hotel_city_key_insert AFTER INSERT ON hotel '
+    'WHEN NEW.city_key IS NOT NULL BEGIN '
+    'INSERT INTO hotelcity(city_key) SELECT NEW.city_key '
+    'WHERE NOT EXISTS (SELECT 1 FROM hotelcity WHERE city_key = NEW.city_key); END',
+    'CREATE TRIGGER hotel_city_key_update AFTER UPDATE OF city_key ON hotel '
+    'WHEN NEW.city_key IS NOT NULL BEGIN '
+    'INSERT INTO hotelcity(city_key) SELECT NEW.city_key '
+    'WHERE NOT EXISTS (SELECT 1 FROM hotelcity WHERE city_key = NEW.city_key); END',
+)
+
+
+def _create_city_search():
+    with engine.begin() as conn:
+        for ddl in CITY_SEARCH_DDL:
+            conn.exec_driver_sql(ddl)
+
+
+# Rows per upsert transaction
+UPSERT_CHUNK_SIZE = 500
+
+
+def bulk_upsert(
+    model: Type[SQLModel],
+    rows: List[Dict[str, Any]],
+    conflict_column: str = "deal_id",
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+) -> int:
+    """
+    Insert or update many rows with INSERT ... ON CONFLICT DO UPDATE.
+    
+    Rows are written in chunks, one transaction per chunk, so a large
+    scan never holds the SQLite write lock for the whole feed.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    
+    table = model.__table__
+    # Never overwrite the primary key, the conflict key or the creation time
+    immutable = {"id", "created_at", conflict_column}
+    
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[conflict_column],
+        set_={
+            column: stmt.excluded[column]
+            for column in rows[0]
+            if column not in immutable
+        }
+    )
+    
+    written = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        # executemany with one compiled statement per chunk, one transaction per chunk
+        with engine.begin() as conn:
+            conn.execute(stmt, chunk)
+        written += len(chunk)
+    
+    return written
 
 
 # ==========================================
@@ -30,6 +150,18 @@ def create_db_and_tables():
 
 class Flight(SQLModel, table=True):
     """Persistent flight record"""
+    __table_args__ = (
+        # Serves route + departure-window lookups for bundle search
+        Index("ix_flight_route_departure", "origin", "destination", "departure_time"),
+        # Serve keyset pages of active deals, best deal_score first, unfiltered
+        # and under each /deals/flights filter (origin, origin + destination,
+        # destination), so a filtered page never walks every active flight
+        Index("ix_flight_active_score", "is_active", "deal_score", "id"),
+        Index("ix_flight_origin_score", "origin", "is_active", "deal_score", "id"),
+        Index("ix_flight_route_score", "origin", "destination", "is_active", "deal_score", "id"),
+        Index("ix_flight_destination_score", "destination", "is_active", "deal_score", "id"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     deal_id: str = Field(index=True, unique=True)
     
@@ -54,6 +186,9 @@ class Flight(SQLModel, table=True):
     # Deal info
     deal_score: int = 0
     tags_json: str = "[]"  # JSON string of tags
+    # Bitmasks from app.models.deal_bits; None on rows not yet backfilled
+    tag_bits: Optional[int] = Field(default=None, index=True)
+    flag_bits: Optional[int] = Field(default=None, index=True)  # RED_EYE, REFUNDABLE
     is_active: bool = True
     expires_at: Optional[datetime] = None
     
@@ -67,11 +202,19 @@ class Flight(SQLModel, table=True):
     
     @property
     def tags(self) -> List[str]:
-        return json.loads(self.tags_json)
+        if self.tag_bits is not None:
+            return tag_values_from_bits(self.tag_bits)
+        return list(json_list(self.tags_json))
     
     @tags.setter
     def tags(self, value: List[str]):
         self.tags_json = json.dumps(value)
+        self.tag_bits = tags_to_bits(value)
+    
+    def encode_bits(self):
+        """Fill the bitmask columns from the JSON and scalar columns"""
+        self.tag_bits = tags_to_bits(json_list(self.tags_json))
+        self.flag_bits = flight_flag_bits(self.departure_time, self.fare_class)
 
 
 # ==========================================
@@ -80,13 +223,24 @@ class Flight(SQLModel, table=True):
 
 class Hotel(SQLModel, table=True):
     """Persistent hotel record"""
+    __table_args__ = (
+        # Serve keyset pages of active deals, best deal_score first, unfiltered
+        # and under the /deals/hotels city filter
+        Index("ix_hotel_active_score", "is_active", "deal_score", "id"),
+        Index("ix_hotel_city_score", "city_key", "is_active", "deal_score", "id"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     deal_id: str = Field(index=True, unique=True)
     
     name: str
     city: str = Field(index=True)
+    # Normalized city (app.services.city_search.city_key) for indexed city lookups
+    city_key: Optional[str] = Field(default=None, index=True)
     neighborhood: str
     stars: int
+    # Primary airport of the hotel's metro, the join key for flight destinations
+    metro_code: Optional[str] = Field(default=None, index=True)
     
     # Pricing
     price_per_night: float
@@ -103,10 +257,14 @@ class Hotel(SQLModel, table=True):
     pet_friendly: bool = False
     breakfast_included: bool = False
     near_transit: bool = False
+    amenity_bits: Optional[int] = Field(default=None, index=True)
+    # PET_FRIENDLY, BREAKFAST_INCLUDED, NEAR_TRANSIT, REFUNDABLE
+    flag_bits: Optional[int] = Field(default=None, index=True)
     
     # Deal info
     deal_score: int = 0
     tags_json: str = "[]"
+    tag_bits: Optional[int] = Field(default=None, index=True)
     is_active: bool = True
     expires_at: Optional[datetime] = None
     
@@ -120,11 +278,27 @@ class Hotel(SQLModel, table=True):
     
     @property
     def tags(self) -> List[str]:
-        return json.loads(self.tags_json)
+        if self.tag_bits is not None:
+            return tag_values_from_bits(self.tag_bits)
+        return list(json_list(self.tags_json))
     
     @property
     def amenities(self) -> List[str]:
-        return json.loads(self.amenities_json)
+        return list(json_list(self.amenities_json))
+    
+    def encode_bits(self):
+        """Fill the bitmask columns from the JSON and scalar columns"""
+        self.tag_bits = tags_to_bits(json_list(self.tags_json))
+        self.amenity_bits = amenities_to_bits(json_list(self.amenities_json))
+        self.flag_bits = hotel_flag_bits(
+            self.pet_friendly, self.breakfast_included, self.near_transit, self.cancellation_policy
+        )
+
+
+class HotelCity(SQLModel, table=True):
+    """Distinct hotel city keys, the content of the hotelcity_fts trigram index"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    city_key: str = Field(unique=True)
 
 
 # ==========================================
@@ -222,3 +396,35 @@ class PriceHistory(SQLModel, table=True):
     price: float
     recorded_at: datetime = Field(default_factory=datetime.utcnow)
 
+
+class PriceDailyAggregate(SQLModel, table=True):
+    """Per-deal, per-day price sum and count buckets for rolling averages"""
+    __table_args__ = (UniqueConstraint("deal_id", "day"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    
+    deal_id: str
+    deal_type: str
+    day: date
+    price_sum: float = 0
+    price_count: int = 0
+
+
+# ==========================================
+# BITMASK BACKFILL
+# ==========================================
+
+def backfill_deal_bits() -> int:
+    """Encode tag, amenity and flag bitmasks on rows stored before those columns existed"""
+    updated = 0
+    for model in (Flight, Hotel):
+        with Session(engine) as session:
+            rows = session.exec(
+                select(model).where((model.flag_bits == None) | (model.tag_bits == None))
+            ).all()
+            for row in rows:
+                row.encode_bits()
+                session.add(row)
+            session.commit()
+        updated += len(rows)
+    return updated
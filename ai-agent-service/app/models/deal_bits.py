@@ -0,0 +1,169 @@
+"""
+Integer bitmask encodings for deal tags, hotel amenities and derived flags
+
+Flight and Hotel rows store tag_bits, amenity_bits and flag_bits next to
+their JSON columns. Filters become bitwise predicates that SQLite
+evaluates, and tags are decoded through lookup tables built once at
+import time rather than parsed on every access.
+
+Bit positions are persisted: only ever append to DealTag and AMENITIES.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+
+from app.models.schemas import DealTag
+
+
+# ==========================================
+# DEAL TAGS
+# ==========================================
+
+TAG_BITS: Dict[DealTag, int] = {tag: 1 << i for i, tag in enumerate(DealTag)}
+
+# Every possible tag mask -> its tags in enum order
+_TAGS_BY_MASK: Tuple[Tuple[DealTag, ...], ...] = tuple(
+    tuple(tag for tag, bit in TAG_BITS.items() if mask & bit)
+    for mask in range(1 << len(TAG_BITS))
+)
+_TAG_VALUES_BY_MASK: Tuple[Tuple[str, ...], ...] = tuple(
+    tuple(tag.value for tag in tags) for tags in _TAGS_BY_MASK
+)
+_ALL_TAGS = (1 << len(TAG_BITS)) - 1
+
+
+def tags_to_bits(tags: Iterable[str]) -> int:
+    """Encode DealTags (or their string values) as a mask; unknown tags are dropped"""
+    bits = 0
+    for tag in tags:
+        bits |= TAG_BITS.get(tag, 0)
+    return bits
+
+
+def tags_from_bits(bits: int) -> List[DealTag]:
+    """Decode a tag bitmask into DealTags, in enum order"""
+    return list(_TAGS_BY_MASK[bits & _ALL_TAGS])
+
+
+def tag_values_from_bits(bits: int) -> List[str]:
+    return list(_TAG_VALUES_BY_MASK[bits & _ALL_TAGS])
+
+
+# ==========================================
+# HOTEL AMENITIES
+# ==========================================
+
+# Known amenity vocabulary; free-text amenities outside it stay in amenities_json only
+AMENITIES: Tuple[str, ...] = (
+    'Free WiFi', 'Pool', 'Gym', 'Spa', 'Pet-friendly', 'Free breakfast',
+    'Near metro', 'Parking', 'Room service', 'Bar', 'Restaurant',
+    'Airport shuttle', 'Kitchen', 'Air conditioning', 'Beach access', 'Business center',
+)
+
+# Other spellings of a vocabulary amenity, like the simple-backend feed's "WiFi"
+AMENITY_ALIASES: Dict[str, str] = {
+    'WiFi': 'Free WiFi',
+    'Breakfast': 'Free breakfast',
+}
+
+AMENITY_BITS: Dict[str, int] = {name.lower(): 1 << i for i, name in enumerate(AMENITIES)}
+AMENITY_BITS.update({alias.lower(): AMENITY_BITS[name.lower()] for alias, name in AMENITY_ALIASES.items()})
+
+
+def amenity_bit(name: str) -> Optional[int]:
+    return AMENITY_BITS.get(name.strip().lower())
+
+
+def amenities_to_bits(amenities: Iterable[str]) -> int:
+    bits = 0
+    for name in amenities:
+        bits |= amenity_bit(name) or 0
+    return bits
+
+
+# ==========================================
+# DERIVED FLAGS
+# ==========================================
+
+# Hotel constraint flags
+PET_FRIENDLY = 1
+BREAKFAST_INCLUDED = 2
+NEAR_TRANSIT = 4
+# Shared by flights (fare class) and hotels (cancellation policy)
+REFUNDABLE = 8
+# Flights departing 11pm-5am
+RED_EYE = 16
+
+REFUNDABLE_FARE_CLASSES = {'business', 'first', 'flex'}
+
+
+def is_red_eye(departure_time: Optional[datetime]) -> bool:
+    if departure_time is None:
+        return False
+    hour = departure_time.hour
+    return 23 <= hour or hour <= 5
+
+
+def is_refundable_fare(fare_class: Optional[str]) -> bool:
+    return (fare_class or '').lower() in REFUNDABLE_FARE_CLASSES
+
+
+def is_refundable_policy(policy: Optional[str]) -> bool:
+    """'Free cancellation' and 'Partial refund' are refundable, 'Non-refundable' isn't"""
+    policy = (policy or '').lower()
+    return 'non-refund' not in policy and ('free' in policy or 'refund' in policy)
+
+
+def flight_flag_bits(departure_time: Optional[datetime], fare_class: Optional[str]) -> int:
+    return (
+        (RED_EYE if is_red_eye(departure_time) else 0)
+        | (REFUNDABLE if is_refundable_fare(fare_class) else 0)
+    )
+
+
+def hotel_flag_bits(
+    pet_friendly: bool,
+    breakfast_included: bool,
+    near_transit: bool,
+    cancellation_policy: Optional[str]
+) -> int:
+    return (
+        (PET_FRIENDLY if pet_friendly else 0)
+        | (BREAKFAST_INCLUDED if breakfast_included else 0)
+        | (NEAR_TRANSIT if near_transit else 0)
+        | (REFUNDABLE if is_refundable_policy(cancellation_policy) else 0)
+    )
+
+
+# ==========================================
+# SQL PREDICATES
+# ==========================================
+
+def has_bits(column, mask: int):
+    """Rows whose bitmask column has every bit in mask set"""
+    return column.op('&')(mask) == mask
+
+
+def lacks_bits(column, mask: int):
+    """Rows whose bitmask column has none of the bits in mask set"""
+    return column.op('&')(mask) == 0
+
+
+def bit_predicates(column, wanted: Dict[int, Optional[bool]]) -> List:
+    """has_bits/lacks_bits for each mask asked for True/False; None means either"""
+    return [
+        has_bits(column, mask) if value else lacks_bits(column, mask)
+        for mask, value in wanted.items()
+        if value is not None
+    ]
+
+
+# ==========================================
+# JSON FALLBACK
+# ==========================================
+
+@lru_cache(maxsize=4096)
+def json_list(value: str) -> Tuple[str, ...]:
+    """Parsed JSON list columns; the same few strings repeat across rows"""
+    return tuple(json.loads(value))
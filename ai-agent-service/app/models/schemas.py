@@ -160,6 +160,17 @@ class BundleResponse(BaseModel):
     suggestions: List[str] = []
 
 
+class BundleBatchRequest(BaseModel):
+    """Several bundle searches, e.g. one per destination tile"""
+    requests: List[BundleRequest] = Field(..., min_length=1, max_length=100)
+
+
+class BundleBatchResponse(BaseModel):
+    """Results in request order, all from the same deal snapshot"""
+    results: List[BundleResponse]
+    snapshot_generation: int
+
+
 # ==========================================
 # CHAT SCHEMAS
 # ==========================================
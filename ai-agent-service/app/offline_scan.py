@@ -0,0 +1,317 @@
+"""
+Offline deal scan for large feeds
+
+Scores a whole feed file outside the FastAPI app:
+
+    python -m app.offline_scan flights.ndjson --type flight --workers 8
+    python -m app.offline_scan hotels.json --type hotel --source simple-backend
+
+The parent process reads the input in chunks and shards them across a
+ProcessPoolExecutor. Workers run deal detection and tagging and send back
+plain row dicts; a single writer thread in the parent bulk-upserts them
+into SQLite in input order, so the last occurrence of a deal_id wins just
+as it does in a live scan.
+
+Workers use the feed's avg_30d_price as-is and do not read or record
+price history, which keeps them free of any database access.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.models.database import Flight, Hotel, bulk_upsert, create_db_and_tables
+from app.services.feed_sources import (
+    iter_json_array, map_simple_backend_flight, map_simple_backend_hotel
+)
+
+
+# ==========================================
+# INPUT READING (parent process)
+# ==========================================
+
+FORMATS = ('json', 'ndjson', 'csv')
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if ext in FORMATS:
+        return ext
+    raise ValueError(f"Cannot infer feed format from {path!r}; pass --format")
+
+
+def read_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[Tuple[str, list]]:
+    """
+    Yield (kind, payload) chunks with as little parsing as possible in the
+    parent: NDJSON lines stay raw text, CSV rows stay lists of strings.
+    """
+    if fmt == 'json':
+        chunk = []
+        for record in iter_json_array(path):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield 'records', chunk
+                chunk = []
+        if chunk:
+            yield 'records', chunk
+
+    elif fmt == 'ndjson':
+        with open(path, 'r', encoding='utf-8') as f:
+            chunk = []
+            for line in f:
+                if line.strip():
+                    chunk.append(line)
+                    if len(chunk) >= chunk_size:
+                        yield 'lines', chunk
+                        chunk = []
+            if chunk:
+                yield 'lines', chunk
+
+    elif fmt == 'csv':
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield 'csv', (header, chunk)
+                    chunk = []
+            if chunk:
+                yield 'csv', (header, chunk)
+
+    else:
+        raise ValueError(f"Unknown feed format: {fmt}")
+
+
+# ==========================================
+# ROW NORMALIZATION (workers)
+# ==========================================
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def _to_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _to_list(value) -> List[str]:
+    if isinstance(value, list):
+        return value
+    value = (value or '').strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [a.strip() for a in value.replace('|', ';').split(';') if a.strip()]
+
+
+# Text feeds (CSV, loosely typed JSON) carry everything as strings
+FIELD_TYPES: Dict[str, Dict[str, Callable]] = {
+    'flight': {
+        'price': float, 'original_price': float, 'avg_30d_price': float,
+        'seats_available': int, 'duration_minutes': int, 'stops': int,
+        'departure_time': _to_datetime, 'arrival_time': _to_datetime, 'is_promo': _to_bool,
+    },
+    'hotel': {
+        'price_per_night': float, 'original_price': float, 'avg_30d_price': float,
+        'rooms_available': int, 'stars': int, 'amenities': _to_list, 'is_promo': _to_bool,
+        'pet_friendly': _to_bool, 'breakfast_included': _to_bool, 'near_transit': _to_bool,
+    },
+}
+
+REQUIRED_FIELDS = {
+    'flight': ('deal_id', 'origin', 'destination', 'airline', 'departure_time',
+               'arrival_time', 'duration_minutes', 'price'),
+    'hotel': ('deal_id', 'name', 'city', 'neighborhood', 'price_per_night'),
+}
+
+MAPPERS = {
+    'flight': map_simple_backend_flight,
+    'hotel': map_simple_backend_hotel,
+}
+
+
+def normalize_row(deal_type: str, raw: Dict[str, Any], source: str) -> Optional[Dict[str, Any]]:
+    """Coerce one input record into the Flight/Hotel shape, or None if unusable"""
+    row = MAPPERS[deal_type](raw) if source == 'simple-backend' else dict(raw)
+    if row is None:
+        return None
+
+    for key, convert in FIELD_TYPES[deal_type].items():
+        value = row.get(key)
+        if value is None or value == '':
+            row.pop(key, None)
+        else:
+            row[key] = convert(value)
+
+    if any(row.get(key) in (None, '') for key in REQUIRED_FIELDS[deal_type]):
+        return None
+    return row
+
+
+# ==========================================
+# WORKERS
+# ==========================================
+
+_worker_agent = None
+
+
+def _init_worker():
+    global _worker_agent
+    from app.agents.deals_agent import DealsAgent
+    _worker_agent = DealsAgent(init_db=False)
+
+
+def score_chunk(deal_type: str, source: str, kind: str, payload) -> Tuple[int, int, List[Dict[str, Any]]]:
+    """
+    Parse, detect and tag one chunk.
+    Returns (rows read, rows rejected, deal rows ready for bulk_upsert).
+    """
+    if kind == 'csv':
+        header, rows = payload
+        raws = [dict(zip(header, row)) for row in rows]
+    else:
+        # NDJSON lines are decoded per record so one bad line is just rejected
+        raws = payload
+
+    rows = []
+    rejected = 0
+    for raw in raws:
+        try:
+            if kind == 'lines':
+                raw = json.loads(raw)
+            row = normalize_row(deal_type, raw, source) if isinstance(raw, dict) else None
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            rejected += 1
+        else:
+            rows.append(row)
+
+    if not rows:
+        return len(raws), rejected, []
+
+    agent = _worker_agent
+    build = agent._build_flight_record if deal_type == 'flight' else agent._build_hotel_record
+    deals = [
+        build(row, detection).model_dump(exclude={'id'})
+        for row, detection in agent._batch_detections(deal_type, rows)
+    ]
+    return len(raws), rejected, deals
+
+
+# ==========================================
+# SCAN DRIVER
+# ==========================================
+
+def run_offline_scan(
+    path: str,
+    deal_type: str,
+    fmt: Optional[str] = None,
+    source: str = 'normalized',
+    workers: Optional[int] = None,
+    chunk_size: int = 5000,
+    write: bool = True
+) -> Dict[str, Any]:
+    """Score a feed file with a process pool and upsert the deals found"""
+    fmt = fmt or detect_format(path)
+    workers = workers or os.cpu_count() or 1
+    model = Flight if deal_type == 'flight' else Hotel
+    if write:
+        create_db_and_tables()
+
+    totals = {'rows': 0, 'rejected': 0, 'deals': 0, 'rows_written': 0}
+    write_seconds = 0.0
+
+    def write_deals(deals: List[Dict[str, Any]]) -> float:
+        started = time.perf_counter()
+        totals['rows_written'] += bulk_upsert(model, deals)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    # Bound in-flight work so memory stays flat regardless of feed size
+    in_flight: Deque[Future] = deque()
+    writes: Deque[Future] = deque()
+    max_in_flight = workers * 2
+
+    def collect(future: Future):
+        nonlocal write_seconds
+        rows, rejected, deals = future.result()
+        totals['rows'] += rows
+        totals['rejected'] += rejected
+        totals['deals'] += len(deals)
+        if write and deals:
+            writes.append(writer.submit(write_deals, deals))
+            while len(writes) > 2:
+                write_seconds += writes.popleft().result()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='offline-writer') as writer:
+        for kind, payload in read_chunks(path, fmt, chunk_size):
+            in_flight.append(pool.submit(score_chunk, deal_type, source, kind, payload))
+            if len(in_flight) >= max_in_flight:
+                collect(in_flight.popleft())
+
+        while in_flight:
+            collect(in_flight.popleft())
+        while writes:
+            write_seconds += writes.popleft().result()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **totals,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_sec': round(totals['rows'] / elapsed, 1) if elapsed > 0 else 0.0,
+        'write_seconds': round(write_seconds, 3),
+        # Close to 1.0 means the single writer is the bottleneck
+        'writer_utilization': round(write_seconds / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score a large deals feed offline and load the deals into SQLite")
+    parser.add_argument('path', help="Feed file (.json array, .ndjson/.jsonl or .csv)")
+    parser.add_argument('--type', dest='deal_type', choices=('flight', 'hotel'), required=True)
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument('--source', choices=('normalized', 'simple-backend'), default='normalized',
+                        help="Record layout: Flight/Hotel fields, or simple-backend's flights.json/hotels.json")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Records per worker task")
+    parser.add_argument('--no-write', action='store_true', help="Score only; skip the SQLite writer")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_offline_scan(
+        args.path, args.deal_type,
+        fmt=args.fmt,
+        source=args.source,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        write=not args.no_write
+    )
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"[OfflineScan] {report['rows']} rows ({report['rejected']} rejected) with {report['workers']} workers "
+              f"in {report['elapsed_seconds']}s: {report['rows_per_sec']} rows/s")
+        print(f"[OfflineScan] {report['deals']} deals, {report['rows_written']} rows written, "
+              f"writer busy {report['write_seconds']}s ({report['writer_utilization']:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Indexed city search for hotels
+
+Hotels store a normalized city_key next to their city. A city filter is
+resolved to a handful of city keys against hotelcity, the small table of
+distinct keys, and hotels are then selected with city_key IN (...) on
+the city_key index. Resolution never scans the hotel table:
+
+- short queries are key prefixes, a range on hotelcity's unique index
+- longer ones are substrings, served by the hotelcity_fts trigram index
+- if no key contains the query, keys sharing most of its trigrams are
+  used instead, so "chicgo" still finds Chicago
+"""
+import re
+import unicodedata
+from typing import List, Set
+
+from sqlalchemy import bindparam, column, table, update
+from sqlmodel import Session, select
+
+from app.models.database import Hotel, HotelCity, engine
+
+
+# Below this length a query has no trigrams, so it can only be a prefix
+MIN_TRIGRAM_QUERY = 3
+# Share of the query's trigrams a key needs for a typo-tolerant match
+FUZZY_MIN_OVERLAP = 0.5
+# Keys a fuzzy lookup considers, best-ranked first
+FUZZY_CANDIDATES = 20
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# The trigram index created by app.models.database._create_city_search
+_city_fts = table('hotelcity_fts', column('city_key'), column('rank'))
+
+
+def city_key(city: str) -> str:
+    """Lowercase, accents stripped, punctuation and whitespace runs collapsed to one space"""
+    decomposed = unicodedata.normalize('NFKD', city or '')
+    ascii_text = decomposed.encode('ascii', 'ignore').decode('ascii').lower()
+    return _NON_ALNUM.sub(' ', ascii_text).strip()
+
+
+def _trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def _prefix_range(key: str):
+    # city_key >= key AND city_key < key + U+FFFF: a prefix match the index can serve
+    return (HotelCity.city_key >= key) & (HotelCity.city_key < key + '\uffff')
+
+
+def _fts_match(query: str):
+    return select(_city_fts.c.city_key).where(_city_fts.c.city_key.op('MATCH')(query))
+
+
+async def resolve_city_keys(session, city: str) -> List[str]:
+    """City keys of hotels matching a city filter, using only the hotelcity indexes"""
+    key = city_key(city)
+    if not key:
+        return []
+
+    if len(key) < MIN_TRIGRAM_QUERY:
+        return list((await session.exec(select(HotelCity.city_key).where(_prefix_range(key)))).all())
+
+    # Keys only hold [0-9a-z ], so quoting the query as one FTS5 phrase is safe
+    keys = (await session.exec(_fts_match(f'"{key}"'))).all()
+    if keys:
+        return list(keys)
+
+    wanted = _trigrams(key)
+    query = ' OR '.join(f'"{trigram}"' for trigram in sorted(wanted))
+    candidates = (await session.exec(
+        _fts_match(query).order_by(_city_fts.c.rank).limit(FUZZY_CANDIDATES)
+    )).all()
+    return [
+        candidate for candidate in candidates
+        if len(wanted & _trigrams(candidate)) >= FUZZY_MIN_OVERLAP * len(wanted)
+    ]
+
+
+def backfill_city_keys() -> int:
+    """Fill city_key on hotel rows stored before the column existed, and index every key"""
+    with Session(engine) as session:
+        rows = session.exec(select(Hotel.id, Hotel.city).where(Hotel.city_key == None)).all()
+
+    updates = [{'hotel_id': hotel_id, 'key': city_key(city)} for hotel_id, city in rows]
+    table = Hotel.__table__
+    with engine.begin() as conn:
+        if updates:
+            conn.execute(
+                update(table).where(table.c.id == bindparam('hotel_id')).values(city_key=bindparam('key')),
+                updates
+            )
+        # Keys written before the search triggers existed
+        conn.exec_driver_sql(
+            'INSERT OR IGNORE INTO hotelcity(city_key) '
+            'SELECT DISTINCT city_key FROM hotel WHERE city_key IS NOT NULL'
+        )
+    return len(updates)
@@ -0,0 +1,225 @@
+"""
+In-memory read model of active deals
+
+The Deals Agent rebuilds a DealSnapshot after every scan and publishes it
+by swapping a single reference. Readers grab the current snapshot once
+per request and never lock; a snapshot is never modified after it is
+published, so a search can't see a half-finished scan.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.models.database import Flight, Hotel, async_session_factory, engine
+from app.models.deal_bits import (
+    PET_FRIENDLY, BREAKFAST_INCLUDED, NEAR_TRANSIT, REFUNDABLE, RED_EYE,
+    flight_flag_bits, has_bits, hotel_flag_bits
+)
+from app.services.metro_codes import metro_for_airport, metro_for_city
+
+
+def hotel_flags(hotel: Hotel) -> int:
+    if hotel.flag_bits is not None:
+        return hotel.flag_bits
+    return hotel_flag_bits(
+        hotel.pet_friendly, hotel.breakfast_included, hotel.near_transit, hotel.cancellation_policy
+    )
+
+
+def flight_flags(flight: Flight) -> int:
+    if flight.flag_bits is not None:
+        return flight.flag_bits
+    return flight_flag_bits(flight.departure_time, flight.fare_class)
+
+
+def _by_deal_score(deal) -> Tuple[int, int]:
+    # Best deals first; ties keep insertion order like the old SQL scan
+    return (-deal.deal_score, deal.id or 0)
+
+
+@dataclass(frozen=True)
+class DealSnapshot:
+    """
+    Active flights by (origin, destination) and active hotels by metro
+    code, each list sorted by deal_score descending. Each route's flights
+    are also kept in departure order, the in-memory counterpart of the
+    (origin, destination, departure_time) index on the flight table.
+    """
+    generation: int = 0
+    flights_by_route: Dict[Tuple[str, str], Tuple[Flight, ...]] = field(default_factory=dict)
+    departures_by_route: Dict[Tuple[str, str], Tuple[Tuple[datetime, ...], Tuple[Flight, ...]]] = field(default_factory=dict)
+    hotels_by_metro: Dict[Optional[str], Tuple[Tuple[Hotel, int], ...]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, flights: Iterable[Flight], hotels: Iterable[Hotel], generation: int) -> 'DealSnapshot':
+        routes: Dict[Tuple[str, str], List[Flight]] = {}
+        for flight in flights:
+            routes.setdefault((flight.origin, flight.destination), []).append(flight)
+
+        departures = {}
+        for route, items in routes.items():
+            by_departure = sorted(items, key=lambda f: (f.departure_time, f.id or 0))
+            departures[route] = (tuple(f.departure_time for f in by_departure), tuple(by_departure))
+
+        metros: Dict[Optional[str], List[Hotel]] = {}
+        for hotel in hotels:
+            metro = hotel.metro_code or metro_for_city(hotel.city, hotel.neighborhood)
+            metros.setdefault(metro, []).append(hotel)
+
+        return cls(
+            generation=generation,
+            flights_by_route={
+                route: tuple(sorted(items, key=_by_deal_score)) for route, items in routes.items()
+            },
+            departures_by_route=departures,
+            hotels_by_metro={
+                metro: tuple((h, hotel_flags(h)) for h in sorted(items, key=_by_deal_score))
+                for metro, items in metros.items()
+            },
+        )
+
+    @property
+    def flight_count(self) -> int:
+        return sum(len(items) for items in self.flights_by_route.values())
+
+    @property
+    def hotel_count(self) -> int:
+        return sum(len(items) for items in self.hotels_by_metro.values())
+
+    def flights(
+        self,
+        origin: Optional[str] = None,
+        destinations: Optional[Iterable[str]] = None,
+        departs_after: Optional[datetime] = None,
+        departs_before: Optional[datetime] = None
+    ) -> List[Flight]:
+        """
+        Flights matching an optional origin, destination set and departure
+        window [departs_after, departs_before), best deal_score first.
+        """
+        wanted = set(destinations) if destinations is not None else None
+        routes = [
+            route for route in self.flights_by_route
+            if (origin is None or route[0] == origin)
+            and (wanted is None or route[1] in wanted)
+        ]
+
+        if departs_after is None and departs_before is None:
+            matches = [flight for route in routes for flight in self.flights_by_route[route]]
+        else:
+            # Binary search each route's departure-ordered list for the window
+            matches = []
+            for route in routes:
+                times, items = self.departures_by_route[route]
+                lo = bisect_left(times, departs_after) if departs_after is not None else 0
+                hi = bisect_left(times, departs_before) if departs_before is not None else len(times)
+                matches.extend(items[lo:hi])
+
+        matches.sort(key=_by_deal_score)
+        return matches
+
+    def hotels(self, required_flags: int = 0) -> List[Hotel]:
+        """Hotels having every required constraint flag, best deal_score first"""
+        matches = [
+            hotel
+            for items in self.hotels_by_metro.values()
+            for hotel, flags in items
+            if flags & required_flags == required_flags
+        ]
+        matches.sort(key=_by_deal_score)
+        return matches
+
+    def hotels_near(self, airport: str, required_flags: int = 0) -> List[Hotel]:
+        """Hotels in the metro an airport serves, best deal_score first"""
+        return [
+            hotel
+            for hotel, flags in self.hotels_by_metro.get(metro_for_airport(airport), ())
+            if flags & required_flags == required_flags
+        ]
+
+
+def _active_flights_query(
+    origin: Optional[str] = None,
+    destinations: Optional[Iterable[str]] = None,
+    departs_after: Optional[datetime] = None,
+    departs_before: Optional[datetime] = None
+):
+    query = select(Flight).where(Flight.is_active == True)
+    if origin is not None:
+        query = query.where(Flight.origin == origin)
+    if destinations is not None:
+        query = query.where(Flight.destination.in_(list(destinations)))
+    if departs_after is not None:
+        query = query.where(Flight.departure_time >= departs_after)
+    if departs_before is not None:
+        query = query.where(Flight.departure_time < departs_before)
+    return query
+
+
+def _active_hotels_query(required_flags: int = 0):
+    query = select(Hotel).where(Hotel.is_active == True)
+    if required_flags:
+        query = query.where(has_bits(Hotel.flag_bits, required_flags))
+    return query
+
+
+def load_snapshot(generation: int = 0, required_hotel_flags: int = 0, **flight_filters) -> DealSnapshot:
+    """
+    Build a snapshot of active deals currently in SQLite. Flights can be
+    narrowed with origin, destinations, departs_after and departs_before,
+    which the flight table's (origin, destination, departure_time) index
+    serves. required_hotel_flags keeps only hotels with every one of
+    those constraint flags set, as a bitwise predicate in SQL.
+    """
+    with Session(engine) as session:
+        flights = session.exec(_active_flights_query(**flight_filters)).all()
+        hotels = session.exec(_active_hotels_query(required_hotel_flags)).all()
+    return DealSnapshot.build(flights, hotels, generation)
+
+
+async def load_snapshot_async(generation: int = 0, required_hotel_flags: int = 0, **flight_filters) -> DealSnapshot:
+    """load_snapshot through the aiosqlite engine, for callers on the event loop"""
+    async with async_session_factory() as session:
+        flights = (await session.exec(_active_flights_query(**flight_filters))).all()
+        hotels = (await session.exec(_active_hotels_query(required_hotel_flags))).all()
+    return DealSnapshot.build(flights, hotels, generation)
+
+
+class DealIndex:
+    """
+    Holds the current DealSnapshot and replaces it wholesale on refresh.
+    Starts out with an empty snapshot so reading it never loads from SQLite
+    on the event loop; the scan run at startup publishes the first real one
+    from the Deals Agent's DB thread.
+    """
+
+    def __init__(self):
+        self._snapshot = DealSnapshot()
+        self._generation = 0
+        # When the current snapshot was published (UTC), None until the first refresh
+        self.published_at: Optional[datetime] = None
+
+    @property
+    def current(self) -> DealSnapshot:
+        return self._snapshot
+
+    @property
+    def generation(self) -> int:
+        """Generation of the published snapshot, 0 before the first refresh"""
+        return self._snapshot.generation
+
+    def refresh(self) -> DealSnapshot:
+        """Load active deals from SQLite, build a new snapshot and publish it"""
+        self._generation += 1
+        snapshot = load_snapshot(self._generation)
+        # Single reference assignment: readers see the old or new snapshot, never a mix
+        self._snapshot = snapshot
+        self.published_at = datetime.now(timezone.utc)
+        return snapshot
+
+
+# Global instance
+deal_index = DealIndex()
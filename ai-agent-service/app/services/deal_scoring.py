@@ -0,0 +1,148 @@
+"""
+Vectorized deal scoring for batches of listings
+
+Applies the same rules as DealsAgent.detect_deal to columnar NumPy arrays,
+so a whole feed can be scored in one pass and Pydantic objects only need
+to be built for the rows that turn out to be deals.
+"""
+from typing import List, NamedTuple, Optional
+import numpy as np
+
+from app.models.schemas import DealTag, DealScore, DealDetectionResult
+from app.models.deal_bits import TAG_BITS, tags_from_bits
+
+
+# ==========================================
+# TAG BITMASKS
+# ==========================================
+
+PRICE_DROP_BIT = TAG_BITS[DealTag.PRICE_DROP]
+LIMITED_AVAILABILITY_BIT = TAG_BITS[DealTag.LIMITED_AVAILABILITY]
+PROMO_BIT = TAG_BITS[DealTag.PROMO]
+
+
+# ==========================================
+# BATCH SCORING
+# ==========================================
+
+class BatchDealScores(NamedTuple):
+    """Per-row scores for a batch of listings"""
+    price_score: np.ndarray
+    availability_score: np.ndarray
+    promo_score: np.ndarray
+    total_score: np.ndarray
+    tag_bits: np.ndarray
+    is_deal: np.ndarray
+
+
+def score_deals_batch(
+    prices: np.ndarray,
+    avg_30d_prices: np.ndarray,
+    inventory: np.ndarray,
+    is_promo: np.ndarray,
+    promo_end_days: np.ndarray
+) -> BatchDealScores:
+    """
+    Score a batch of listings in one pass.
+
+    Missing 30-day averages are passed as NaN. The result matches
+    DealsAgent.detect_deal row for row.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    avg_30d_prices = np.asarray(avg_30d_prices, dtype=np.float64)
+    inventory = np.asarray(inventory, dtype=np.int64)
+    is_promo = np.asarray(is_promo, dtype=bool)
+    promo_end_days = np.asarray(promo_end_days, dtype=np.int64)
+
+    # Price Score (0-40)
+    has_avg = avg_30d_prices > 0  # False for NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discount_pct = (avg_30d_prices - prices) / avg_30d_prices * 100
+    discount_pct = np.where(has_avg, discount_pct, -np.inf)
+    price_score = np.select(
+        [discount_pct >= 25, discount_pct >= 20, discount_pct >= 15, discount_pct >= 10, discount_pct >= 5],
+        [40, 35, 30, 20, 10],
+        default=0
+    )
+    price_tag = price_score >= 30
+
+    # Availability Score (0-30)
+    availability_score = np.select(
+        [inventory <= 2, inventory <= 5, inventory <= 10],
+        [30, 25, 15],
+        default=0
+    )
+    availability_tag = inventory <= 5
+
+    # Promo Score (0-30)
+    promo_score = np.select(
+        [is_promo & (promo_end_days <= 1), is_promo & (promo_end_days <= 3), is_promo & (promo_end_days <= 7)],
+        [30, 25, 15],
+        default=0
+    )
+    promo_tag = promo_score > 0
+
+    total_score = price_score + availability_score + promo_score
+    tag_bits = (
+        price_tag * PRICE_DROP_BIT
+        | availability_tag * LIMITED_AVAILABILITY_BIT
+        | promo_tag * PROMO_BIT
+    )
+    tag_count = price_tag.astype(np.int8) + availability_tag + promo_tag
+    is_deal = (total_score >= 30) | (tag_count >= 2)
+
+    return BatchDealScores(
+        price_score=price_score,
+        availability_score=availability_score,
+        promo_score=promo_score,
+        total_score=total_score,
+        tag_bits=tag_bits,
+        is_deal=is_deal
+    )
+
+
+# ==========================================
+# RESULT MATERIALIZATION
+# ==========================================
+
+def explain_deal(
+    tags: List[DealTag],
+    current_price: float,
+    avg_30d_price: Optional[float],
+    inventory: int,
+    promo_end_days: int
+) -> str:
+    """Build the short explanation shown for a detected deal"""
+    explanations = []
+    if DealTag.PRICE_DROP in tags:
+        discount = ((avg_30d_price - current_price) / avg_30d_price * 100) if avg_30d_price else 0
+        explanations.append(f"{discount:.0f}% below 30-day avg")
+    if DealTag.LIMITED_AVAILABILITY in tags:
+        explanations.append(f"Only {inventory} left")
+    if DealTag.PROMO in tags:
+        explanations.append(f"Promo ends in {promo_end_days} days")
+
+    return " • ".join(explanations) if explanations else "Standard pricing"
+
+
+def detection_result(
+    scores: BatchDealScores,
+    i: int,
+    current_price: float,
+    avg_30d_price: Optional[float],
+    inventory: int,
+    promo_end_days: int
+) -> DealDetectionResult:
+    """Build the DealDetectionResult for row i of a scored batch"""
+    tags = tags_from_bits(int(scores.tag_bits[i]))
+    return DealDetectionResult(
+        is_deal=bool(scores.is_deal[i]),
+        score=DealScore(
+            price_score=int(scores.price_score[i]),
+            availability_score=int(scores.availability_score[i]),
+            promo_score=int(scores.promo_score[i]),
+            total_score=int(scores.total_score[i])
+        ),
+        tags=tags,
+        explanation=explain_deal(tags, current_price, avg_30d_price, inventory, promo_end_days)
+    )
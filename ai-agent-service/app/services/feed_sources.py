@@ -0,0 +1,238 @@
+"""
+Feed sources for the Deals Agent
+
+A feed source is an iterable of Flight- or Hotel-shaped dicts for one
+deal type. The scan pipeline pulls from sources batch by batch, so a
+source that streams (like JsonArrayFileSource) keeps memory bounded
+regardless of feed size.
+"""
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# ==========================================
+# SOURCE INTERFACE
+# ==========================================
+
+class FeedSource:
+    """A stream of normalized listings for one deal type"""
+    deal_type: str = ''
+    name: str = ''
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_records()
+
+
+class MockFeedSource(FeedSource):
+    """Random listings from one of DealsAgent's mock generators"""
+
+    def __init__(self, deal_type: str, generator: Callable[[int], List[Dict[str, Any]]], count: int = 50):
+        self.deal_type = deal_type
+        self.name = f"mock:{deal_type}"
+        self.generator = generator
+        self.count = count
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.generator(self.count))
+
+
+class JsonArrayFileSource(FeedSource):
+    """
+    Streams the records of a top-level JSON array file one at a time and
+    maps each into the Flight/Hotel shape.
+    """
+
+    def __init__(self, path: str, deal_type: str, mapper: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]):
+        self.path = path
+        self.deal_type = deal_type
+        self.name = f"file:{os.path.basename(path)}"
+        self.mapper = mapper
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for raw in iter_json_array(self.path):
+            record = self.mapper(raw)
+            if record is not None:
+                yield record
+
+
+# ==========================================
+# INCREMENTAL JSON ARRAY PARSER
+# ==========================================
+
+_WHITESPACE = ' \t\n\r'
+_SEPARATORS = _WHITESPACE + ',]'
+
+
+def iter_json_array(path: str, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    Yield the elements of a JSON array file without loading the document.
+
+    The file is read in chunk_size pieces and each element is decoded with
+    JSONDecoder.raw_decode as soon as it is complete, so the buffer never
+    holds much more than one chunk plus one element.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+        started = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        while True:
+            # Skip whitespace and separators
+            while True:
+                while pos < len(buf) and (buf[pos] in _WHITESPACE or (started and buf[pos] == ',')):
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    break
+
+            if pos >= len(buf):
+                raise ValueError(f"{path}: unexpected end of JSON array")
+
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError(f"{path}: expected a top-level JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == ']':
+                return
+
+            # Decode one element, reading more until it is complete. A number
+            # cut at the buffer edge ("-1." of "-1.5") still decodes, so only
+            # accept a value once it is followed by a separator (or EOF).
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    if eof or (end < len(buf) and buf[end] in _SEPARATORS):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+            pos = end
+            yield value
+
+
+# ==========================================
+# SIMPLE-BACKEND RECORD MAPPERS
+# ==========================================
+
+_DURATION_RE = re.compile(r'(?:(\d+)\s*h)?\s*(?:(\d+)\s*m)?')
+
+
+def _parse_duration(value: str) -> int:
+    """'7h 00m' -> 420"""
+    match = _DURATION_RE.match(value or '')
+    if not match or not any(match.groups()):
+        return 0
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+# Start of the synthesized departure window as an ISO date; unset means the
+# first of the current month. Anchoring to today would move every departure,
+# and so every fingerprint, once a day; a month anchor moves them once a
+# month while keeping them in the future.
+FEED_DEPARTURE_ANCHOR = os.getenv("FEED_DEPARTURE_ANCHOR")
+
+
+def _departure_anchor() -> datetime:
+    if FEED_DEPARTURE_ANCHOR:
+        return datetime.fromisoformat(FEED_DEPARTURE_ANCHOR[:10])
+    return datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _departure_for(flight_id: str, clock: str, date: Optional[str] = None) -> datetime:
+    """
+    The simple-backend feed usually only has a time of day. Records with
+    a departure_date use it; the rest are spread over 30-90 days after
+    the departure anchor deterministically by flight number.
+    """
+    hour, _, minute = (clock or '00:00').partition(':')
+    if date:
+        day = datetime.fromisoformat(date[:10])
+    else:
+        digits = re.sub(r'\D', '', flight_id) or '0'
+        day = _departure_anchor() + timedelta(days=30 + int(digits) % 60)
+    return day.replace(hour=int(hour) % 24, minute=int(minute or 0) % 60)
+
+
+def map_simple_backend_flight(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map a simple-backend flights.json record into the Flight shape"""
+    if not raw.get('flight_id') or raw.get('price') is None:
+        return None
+
+    departure = _departure_for(raw['flight_id'], raw.get('departure_time'), raw.get('departure_date'))
+    duration = _parse_duration(raw.get('duration'))
+
+    return {
+        'deal_id': raw['flight_id'],
+        'origin': raw.get('departure_airport', ''),
+        'destination': raw.get('arrival_airport', ''),
+        'airline': raw.get('airline_name', ''),
+        'departure_time': departure,
+        'arrival_time': departure + timedelta(minutes=duration),
+        'duration_minutes': duration,
+        'stops': raw.get('stops', 0),
+        'price': float(raw['price']),
+        'original_price': float(raw.get('original_price', raw['price'])),
+        'avg_30d_price': raw.get('avg_30d_price'),
+        'seats_available': int(raw.get('seatsAvailable', raw.get('total_seats', 100))),
+        'fare_class': raw.get('flight_class', 'Economy'),
+        'is_promo': bool(raw.get('is_promo', False)),
+    }
+
+
+def map_simple_backend_hotel(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map a simple-backend hotels.json record into the Hotel shape"""
+    if not raw.get('hotel_id') or raw.get('price_per_night') is None:
+        return None
+
+    amenities = raw.get('amenities') or []
+    return {
+        'deal_id': raw['hotel_id'],
+        'name': raw.get('hotel_name', ''),
+        'city': raw.get('city', ''),
+        'neighborhood': raw.get('neighborhood') or raw.get('city', ''),
+        'stars': int(raw.get('star_rating', 3)),
+        'price_per_night': float(raw['price_per_night']),
+        'original_price': float(raw.get('original_price', raw['price_per_night'])),
+        'avg_30d_price': raw.get('avg_30d_price'),
+        'rooms_available': int(raw.get('roomsAvailable', raw.get('total_rooms', 100))),
+        'amenities': amenities,
+        'cancellation_policy': raw.get('cancellation_policy', 'Non-refundable'),
+        'is_promo': bool(raw.get('is_promo', False)),
+    }
+
+
+def simple_backend_sources(data_dir: str) -> List[FeedSource]:
+    """File sources for the simple-backend flights.json and hotels.json feeds"""
+    sources = []
+    flights_path = os.path.join(data_dir, 'flights.json')
+    hotels_path = os.path.join(data_dir, 'hotels.json')
+
+    if os.path.exists(flights_path):
+        sources.append(JsonArrayFileSource(flights_path, 'flight', map_simple_backend_flight))
+    if os.path.exists(hotels_path):
+        sources.append(JsonArrayFileSource(hotels_path, 'hotel', map_simple_backend_hotel))
+    return sources
@@ -0,0 +1,280 @@
+"""
+Lightweight Prometheus-style metrics
+
+Counters, gauges and histograms with labels, rendered in the text
+exposition format by /metrics. Recording is a dict lookup plus a few
+additions, cheap enough to leave on in production.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Scan threads and the event loop both record
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+            for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        # Gauges that mirror live state are read at scrape time instead of being pushed
+        self._callback = callback
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if self._callback:
+            items = list(self._callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+            for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[i] += 1
+            self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items()]
+
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            cumulative += counts[-1]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global instance
+registry = MetricsRegistry()
+
+
+# ==========================================
+# SERVICE METRICS
+# ==========================================
+
+http_request_duration = registry.histogram(
+    'kayak_ai_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status')
+)
+scan_duration = registry.histogram(
+    'kayak_ai_scan_duration_seconds', 'Duration of a deals feed scan',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+scan_stage_seconds = registry.counter(
+    'kayak_ai_scan_stage_busy_seconds_total', 'Time spent in each scan pipeline stage', ('stage',)
+)
+scan_stage_items = registry.counter(
+    'kayak_ai_scan_stage_items_total', 'Items handled by each scan pipeline stage', ('stage',)
+)
+deals_found = registry.histogram(
+    'kayak_ai_scan_deals_found', 'Deals found per scan', ('deal_type',),
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+)
+websocket_send_failures = registry.counter(
+    'kayak_ai_websocket_send_failures_total', 'WebSocket sends that failed and dropped the connection'
+)
+db_session_duration = registry.histogram(
+    'kayak_ai_db_session_seconds', 'Time from a DB session or connection starting a transaction to it ending'
+)
+
+
+# ==========================================
+# INSTRUMENTATION
+# ==========================================
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests by route template (e.g. /watches/{user_id})"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = ['500']
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = str(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope.get('method', ''),
+                route.path if route is not None else 'unmatched',
+                status[0]
+            )
+
+
+def _session_transaction_started(session, transaction):
+    if transaction.parent is None:
+        session.info['_metrics_tx_started'] = time.perf_counter()
+
+
+def _session_transaction_ended(session, transaction):
+    if transaction.parent is None:
+        started = session.info.pop('_metrics_tx_started', None)
+        if started is not None:
+            db_session_duration.observe(time.perf_counter() - started)
+
+
+def _session_connection_begun(session, transaction, connection):
+    # The session times this transaction; don't count its connection again
+    connection.info.pop('_metrics_tx_started', None)
+
+
+def _connection_transaction_started(conn):
+    conn.info['_metrics_tx_started'] = time.perf_counter()
+
+
+def _connection_transaction_ended(conn):
+    started = conn.info.pop('_metrics_tx_started', None)
+    if started is not None:
+        db_session_duration.observe(time.perf_counter() - started)
+
+
+def instrument_db_sessions():
+    """
+    Time every DB transaction: SQLModel sessions from begin to commit/rollback/close,
+    bare connections (bulk_upsert, record_prices) from begin to commit/rollback
+    """
+    if not event.contains(Session, 'after_transaction_create', _session_transaction_started):
+        event.listen(Session, 'after_transaction_create', _session_transaction_started)
+        event.listen(Session, 'after_transaction_end', _session_transaction_ended)
+        event.listen(Session, 'after_begin', _session_connection_begun)
+        event.listen(Engine, 'begin', _connection_transaction_started)
+        event.listen(Engine, 'commit', _connection_transaction_ended)
+        event.listen(Engine, 'rollback', _connection_transaction_ended)
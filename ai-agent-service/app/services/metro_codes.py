@@ -0,0 +1,132 @@
+"""
+Metro codes: the join key between flights and hotels
+
+A metro code is the primary airport code of a metropolitan area (JFK for
+New York, MIA for Miami). Hotels get one at ingest, resolved from their
+city or neighborhood; flights map their destination airport to one. Bundle
+search then joins the two with a dict lookup instead of comparing city
+strings against every airport.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from app.models.database import Hotel, engine
+
+
+# City names and abbreviations recognized in chat, in match priority order
+CITY_AIRPORTS: Dict[str, str] = {
+    'new york': 'JFK', 'nyc': 'JFK', 'manhattan': 'JFK',
+    'los angeles': 'LAX', 'la': 'LAX',
+    'san francisco': 'SFO', 'sf': 'SFO',
+    'miami': 'MIA',
+    'chicago': 'ORD',
+    'boston': 'BOS',
+    'seattle': 'SEA',
+    'denver': 'DEN',
+    'dallas': 'DFW',
+    'atlanta': 'ATL',
+}
+
+# Neighborhoods and cities that only show up on hotel listings
+METRO_ALIASES: Dict[str, str] = {
+    'brooklyn': 'JFK', 'queens': 'JFK', 'soho': 'JFK', 'times square': 'JFK',
+    'hollywood': 'LAX', 'santa monica': 'LAX', 'beverly hills': 'LAX',
+    'south beach': 'MIA', 'miami beach': 'MIA', 'brickell': 'MIA', 'coral gables': 'MIA',
+    'houston': 'IAH', 'detroit': 'DTW', 'minneapolis': 'MSP', 'phoenix': 'PHX', 'las vegas': 'LAS',
+}
+
+# Secondary airports that serve the same metro
+AIRPORT_METROS: Dict[str, str] = {
+    'LGA': 'JFK', 'EWR': 'JFK',
+    'MDW': 'ORD',
+    'OAK': 'SFO',
+    'DAL': 'DFW',
+    'HOU': 'IAH',
+    'FLL': 'MIA',
+}
+
+AIRPORTS_FILE = os.getenv(
+    'AIRPORTS_FILE',
+    os.path.join(os.path.dirname(__file__), '..', '..', '..', 'simple-backend', 'data', 'airports.json')
+)
+
+
+def _normalize(text: str) -> str:
+    return ' '.join((text or '').lower().split())
+
+
+@lru_cache(maxsize=1)
+def _alias_table():
+    """City alias -> metro code, plus one word-boundary regex over all aliases"""
+    aliases: Dict[str, str] = {}
+
+    if os.path.exists(AIRPORTS_FILE):
+        with open(AIRPORTS_FILE, 'r', encoding='utf-8') as f:
+            for airport in json.load(f):
+                if airport.get('code') and airport.get('city'):
+                    aliases[_normalize(airport['city'])] = metro_for_airport(airport['code'])
+
+    for city, code in {**CITY_AIRPORTS, **METRO_ALIASES}.items():
+        aliases.setdefault(city, metro_for_airport(code))
+
+    # Longest alias first so "south beach" wins over a shorter overlapping alias
+    pattern = re.compile(
+        r'\b(' + '|'.join(re.escape(a) for a in sorted(aliases, key=len, reverse=True)) + r')\b'
+    )
+    return aliases, pattern
+
+
+def metro_for_airport(airport: str) -> str:
+    """Metro code for an airport; an airport with no known metro is its own"""
+    code = (airport or '').upper()
+    return AIRPORT_METROS.get(code, code)
+
+
+@lru_cache(maxsize=4096)
+def _metro_for_place(place: str) -> Optional[str]:
+    aliases, pattern = _alias_table()
+    if place in aliases:
+        return aliases[place]
+    match = pattern.search(place)
+    return aliases[match.group(1)] if match else None
+
+
+def metro_for_city(city: str, neighborhood: Optional[str] = None) -> Optional[str]:
+    """
+    Resolve a hotel's metro code from its city, falling back to its
+    neighborhood. Aliases match whole words, so "Brooklyn" and
+    "South Beach, Miami" resolve but "Atlanta" doesn't match "la".
+    """
+    for place in (city, neighborhood):
+        code = _metro_for_place(_normalize(place)) if place else None
+        if code:
+            return code
+    return None
+
+
+def backfill_metro_codes() -> int:
+    """Fill metro_code on hotel rows stored before the column existed"""
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Hotel.id, Hotel.city, Hotel.neighborhood).where(Hotel.metro_code == None)
+        ).all()
+
+    updates = [
+        {'hotel_id': hotel_id, 'code': code}
+        for hotel_id, city, neighborhood in rows
+        if (code := metro_for_city(city, neighborhood))
+    ]
+    if updates:
+        table = Hotel.__table__
+        with engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.id == bindparam('hotel_id')).values(metro_code=bindparam('code')),
+                updates
+            )
+    return len(updates)
@@ -0,0 +1,86 @@
+"""
+Keyset pagination over deals, best deal_score first
+
+Pages are ordered by (deal_score DESC, id DESC) and a cursor is the key
+of the last row served. The next page is read as two ranges on the
+(is_active, deal_score, id) indexes: the rest of the cursor's score
+(deal_score = s AND id < i), then lower scores (deal_score < s). A deep
+page costs the same as the first instead of skipping every row before
+it like OFFSET would. SQLite serves a single (deal_score, id) < (s, i)
+row-value range only on deal_score, so inside a large group of equal
+scores it would scan the whole group.
+
+Filtered pages need an index that leads with the filter columns and
+ends with (is_active, deal_score, id), like ix_hotel_city_score, or
+SQLite walks the unfiltered (is_active, deal_score, id) index and tests
+the filter row by row.
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+# Rows per query when streaming every active deal
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_cursor(deal_score: int, row_id: int) -> str:
+    """Opaque URL-safe cursor for the row after which the next page starts"""
+    raw = json.dumps([deal_score, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """(deal_score, id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        deal_score, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(deal_score, int) or not isinstance(row_id, int):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return deal_score, row_id
+
+
+async def fetch_keyset_page(
+    session,
+    query,
+    model,
+    after: Optional[Tuple[int, int]],
+    limit: int,
+    order_from_index: bool = True
+) -> List[Any]:
+    """
+    Rows of query in keyset order, starting after the (deal_score, id)
+    key when given. Returns up to limit + 1 rows so the caller can tell
+    whether another page follows.
+
+    order_from_index=False is for filters matched with IN on their index's
+    leading column: no index can then return rows in score order, and
+    SQLite would rather walk the (is_active, deal_score, id) index than
+    sort. Sorting on deal_score + 0 takes that option away, so the filter's
+    index is searched and only the matching rows are sorted.
+    """
+    deal_score_key = model.deal_score if order_from_index else model.deal_score + 0
+    ordered = query.order_by(deal_score_key.desc(), model.id.desc())
+    if after is None:
+        return list((await session.exec(ordered.limit(limit + 1))).all())
+
+    deal_score, row_id = after
+    rows = list((await session.exec(
+        ordered.where(model.deal_score == deal_score, model.id < row_id).limit(limit + 1)
+    )).all())
+    if len(rows) <= limit:
+        rows += (await session.exec(
+            ordered.where(model.deal_score < deal_score).limit(limit + 1 - len(rows))
+        )).all()
+    return rows
+
+
+def split_page(rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """The page's rows and the cursor of the next page, None on the last one"""
+    page = list(rows[:limit])
+    if len(rows) <= limit:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last.deal_score, last.id)
@@ -0,0 +1,115 @@
+"""
+Price history recording and rolling averages
+
+Every observed price is folded into a per-deal, per-day
+PriceDailyAggregate bucket, and prices of new or changed listings are
+also appended to PriceHistory. Rolling averages are read from the
+buckets only, so a 30-day average touches at most 30 rows per deal no
+matter how large the raw history grows.
+"""
+import itertools
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.database import PriceDailyAggregate, PriceHistory, engine, UPSERT_CHUNK_SIZE
+
+
+# Deal ids per IN (...) lookup
+LOOKUP_CHUNK_SIZE = 500
+
+
+def record_prices(
+    observations: Iterable[Tuple[str, str, float]],
+    observed_at: Optional[datetime] = None,
+    aggregate_only: Iterable[Tuple[str, str, float]] = ()
+) -> int:
+    """
+    Record (deal_id, deal_type, price) observations.
+    
+    Raw rows go to PriceHistory; the matching day buckets are incremented
+    with INSERT ... ON CONFLICT DO UPDATE. aggregate_only observations,
+    steady prices of unchanged listings, only count towards the buckets.
+    Returns the number of observations.
+    """
+    observed_at = observed_at or datetime.utcnow()
+    day = observed_at.date()
+    
+    history_rows = [
+        {'deal_id': deal_id, 'deal_type': deal_type, 'price': price, 'recorded_at': observed_at}
+        for deal_id, deal_type, price in observations
+    ]
+    steady_rows = list(aggregate_only)
+    if not history_rows and not steady_rows:
+        return 0
+    
+    # Fold repeated observations of one deal into a single bucket update
+    buckets: Dict[str, List] = defaultdict(lambda: [None, 0.0, 0])
+    for deal_id, deal_type, price in itertools.chain(
+        ((r['deal_id'], r['deal_type'], r['price']) for r in history_rows), steady_rows
+    ):
+        bucket = buckets[deal_id]
+        bucket[0] = deal_type
+        bucket[1] += price
+        bucket[2] += 1
+    aggregate_rows = [
+        {'deal_id': deal_id, 'deal_type': deal_type, 'day': day, 'price_sum': price_sum, 'price_count': count}
+        for deal_id, (deal_type, price_sum, count) in buckets.items()
+    ]
+    
+    table = PriceDailyAggregate.__table__
+    upsert = sqlite_insert(table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['deal_id', 'day'],
+        set_={
+            'price_sum': table.c.price_sum + upsert.excluded.price_sum,
+            'price_count': table.c.price_count + upsert.excluded.price_count,
+        }
+    )
+    
+    with engine.begin() as conn:
+        for start in range(0, len(history_rows), UPSERT_CHUNK_SIZE):
+            conn.execute(PriceHistory.__table__.insert(), history_rows[start:start + UPSERT_CHUNK_SIZE])
+        for start in range(0, len(aggregate_rows), UPSERT_CHUNK_SIZE):
+            conn.execute(upsert, aggregate_rows[start:start + UPSERT_CHUNK_SIZE])
+    
+    return len(history_rows) + len(steady_rows)
+
+
+def rolling_averages(
+    deal_ids: Iterable[str],
+    days: int = 30,
+    as_of: Optional[datetime] = None
+) -> Dict[str, float]:
+    """
+    Average observed price per deal over the last `days` days.
+    
+    Deals without any observation in the window are left out.
+    """
+    as_of = as_of or datetime.utcnow()
+    start_day = (as_of - timedelta(days=days - 1)).date()
+    deal_ids = list(dict.fromkeys(deal_ids))
+    
+    table = PriceDailyAggregate.__table__
+    averages: Dict[str, float] = {}
+    
+    with engine.connect() as conn:
+        for start in range(0, len(deal_ids), LOOKUP_CHUNK_SIZE):
+            chunk = deal_ids[start:start + LOOKUP_CHUNK_SIZE]
+            query = (
+                select(
+                    table.c.deal_id,
+                    func.sum(table.c.price_sum),
+                    func.sum(table.c.price_count)
+                )
+                .where(table.c.deal_id.in_(chunk), table.c.day >= start_day)
+                .group_by(table.c.deal_id)
+            )
+            for deal_id, price_sum, count in conn.execute(query):
+                if count:
+                    averages[deal_id] = price_sum / count
+    
+    return averages
@@ -0,0 +1,151 @@
+"""
+Generation-tagged LRU cache with TTL
+
+Entries remember the deal-data generation they were computed from. A
+lookup with a newer generation treats the entry as stale, so results
+computed before a scan are never served after it, without having to
+flush the cache when the scan finishes. ResponseCache keeps rendered
+HTTP bodies with their validators for conditional GETs.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+class GenerationalCache:
+    """Bounded LRU map of key -> (generation, stored_at, value)"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Cached value for key if it was computed at this generation and hasn't expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_generation, stored_at, value = entry
+            if entry_generation != generation:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'stale': self.stale,
+            'expired': self.expired,
+            'evictions': self.evictions,
+        }
+
+
+class CachedResponse(NamedTuple):
+    """A rendered response body and its validators"""
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime]
+
+
+class ResponseCache(GenerationalCache):
+    """
+    GenerationalCache of rendered response bodies for conditional GETs.
+    The ETag hashes the body, so a client revalidating after a scan that
+    didn't change its result still gets a 304.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 300.0):
+        super().__init__(max_entries, ttl_seconds)
+        self.not_modified = 0
+
+    def store(
+        self,
+        key: Hashable,
+        generation: int,
+        body: bytes,
+        last_modified: Optional[datetime] = None
+    ) -> CachedResponse:
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        response = CachedResponse(body, etag, last_modified)
+        self.put(key, generation, response)
+        return response
+
+    def is_not_modified(
+        self,
+        response: CachedResponse,
+        if_none_match: Optional[str],
+        if_modified_since: Optional[str]
+    ) -> bool:
+        """Whether the request's validators still match; If-None-Match wins when both are sent"""
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            fresh = '*' in tags or response.etag in tags
+        elif if_modified_since is not None and response.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates have whole-second precision
+            fresh = since.tzinfo is not None and response.last_modified.replace(microsecond=0) <= since
+        else:
+            fresh = False
+
+        if fresh:
+            with self._lock:
+                self.not_modified += 1
+        return fresh
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), 'not_modified': self.not_modified}
+
+
+# Global instance for ConciergeAgent.find_bundles results
+bundle_cache = GenerationalCache(max_entries=1024, ttl_seconds=300.0)
+
+# Global instance for /deals/* response bodies
+deals_response_cache = ResponseCache(max_entries=512, ttl_seconds=300.0)
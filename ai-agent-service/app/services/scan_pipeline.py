@@ -0,0 +1,154 @@
+"""
+Staged asynchronous scan pipeline
+
+A scan runs as ingest → detect → tag → persist → emit. Each stage is a
+single worker task reading batches from a bounded asyncio.Queue, so a
+slow stage applies back-pressure upstream instead of buffering the
+whole feed. Stages that block (DB writes, CPU-heavy tagging) hand their
+work to an executor so the event loop keeps serving requests.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class ScanBatch:
+    """A chunk of feed rows travelling through the pipeline"""
+    deal_type: str
+    rows: List[Dict[str, Any]]
+    detections: List[Tuple[Dict[str, Any], Any]] = field(default_factory=list)
+    records: List[Any] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        # Size of the most recent payload a stage produced
+        if self.records:
+            return len(self.records)
+        if self.detections:
+            return len(self.detections)
+        return len(self.rows)
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    queue: Optional[asyncio.Queue] = field(default=None, repr=False)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'batches': self.batches,
+            'busy_seconds': round(self.busy_seconds, 4),
+            'items_per_sec': round(self.items_per_sec, 1),
+            'queue_depth': self.queue_depth,
+        }
+
+
+StageFn = Callable[[ScanBatch], Awaitable[Optional[ScanBatch]]]
+
+# End-of-stream marker passed down the queues
+_DONE = None
+
+
+class ScanPipeline:
+    """
+    Runs feed rows through a chain of async stages connected by bounded queues.
+
+    Each stage function receives a ScanBatch and returns the batch to pass
+    on, or None to drop it (e.g. no deals in the batch).
+    """
+
+    def __init__(self, stages: List[Tuple[str, StageFn]], batch_size: int = 250, queue_size: int = 4):
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stages = stages
+        self.stats: List[StageStats] = [StageStats(name='ingest')] + [
+            StageStats(name=name) for name, _ in stages
+        ]
+
+    async def run(self, sources: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]) -> List[StageStats]:
+        """
+        Feed every (deal_type, rows) source through the stages concurrently
+        and wait for completion.
+        """
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for stats, queue in zip(self.stats[1:], queues):
+            stats.queue = queue
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for i, (_, fn) in enumerate(self.stages):
+                    outbox = queues[i + 1] if i + 1 < len(queues) else None
+                    tg.create_task(self._run_stage(self.stats[i + 1], fn, queues[i], outbox))
+
+                await asyncio.gather(*(
+                    self._ingest(deal_type, rows, queues[0])
+                    for deal_type, rows in sources
+                ))
+                await queues[0].put(_DONE)
+        except ExceptionGroup as eg:
+            # Surface the first stage failure as a plain exception
+            raise eg.exceptions[0]
+
+        return self.stats
+
+    async def _ingest(self, deal_type: str, rows: Iterable[Dict[str, Any]], outbox: asyncio.Queue):
+        """Read a source in batches off the event loop and feed the first stage"""
+        stats = self.stats[0]
+        iterator = iter(rows)
+
+        while True:
+            started = time.perf_counter()
+            chunk = await asyncio.to_thread(self._next_chunk, iterator)
+            stats.busy_seconds += time.perf_counter() - started
+            if not chunk:
+                return
+
+            stats.items += len(chunk)
+            stats.batches += 1
+            await outbox.put(ScanBatch(deal_type=deal_type, rows=chunk))
+
+    def _next_chunk(self, iterator: Iterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        chunk = []
+        for row in iterator:
+            chunk.append(row)
+            if len(chunk) >= self.batch_size:
+                break
+        return chunk
+
+    async def _run_stage(
+        self,
+        stats: StageStats,
+        fn: StageFn,
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue]
+    ):
+        while True:
+            batch = await inbox.get()
+            if batch is _DONE:
+                if outbox is not None:
+                    await outbox.put(_DONE)
+                return
+
+            started = time.perf_counter()
+            stats.items += len(batch)
+            stats.batches += 1
+            result = await fn(batch)
+            stats.busy_seconds += time.perf_counter() - started
+
+            if result is not None and outbox is not None:
+                await outbox.put(result)
@@ -0,0 +1,155 @@
+"""
+Write-behind cache of chat session state
+
+ConciergeAgent reads and updates ChatSession rows on every chat turn.
+Active sessions live here instead: a turn reads and mutates the cached
+object, marks it dirty, and a background task upserts dirty sessions to
+SQLite in batches. Idle sessions are evicted (LRU + TTL) so memory stays
+bounded; a dirty session is kept until it has been written.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from sqlmodel import select
+
+from app.models.database import ChatSession, async_session_factory, bulk_upsert
+
+
+class ChatSessionStore:
+    """LRU of session_id -> ChatSession with batched write-behind to SQLite"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 1800.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # session_id -> (last access, session), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, ChatSession]]" = OrderedDict()
+        # Sessions changed since the last flush, including evicted ones
+        self._dirty: Dict[str, ChatSession] = {}
+        # Sessions taken by a flush that is still writing
+        self._flushing: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    async def get_or_create(self, session_id: str, known_new: bool = False) -> ChatSession:
+        """
+        Cached session state, loading it from SQLite on a miss. known_new
+        skips the lookup for ids the caller just generated.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry:
+                chat_session = entry[1]
+            else:
+                # Evicted but not yet written: SQLite may still hold an older copy
+                chat_session = self._dirty.get(session_id) or self._flushing.get(session_id)
+            if chat_session is not None:
+                self.hits += 1
+                self._entries[session_id] = (now, chat_session)
+                self._entries.move_to_end(session_id)
+                self._evict(now)
+                return chat_session
+            self.misses += 1
+
+        chat_session = None
+        if not known_new:
+            async with async_session_factory() as db_session:
+                chat_session = (await db_session.exec(
+                    select(ChatSession).where(ChatSession.session_id == session_id)
+                )).first()
+
+        with self._lock:
+            # Another caller may have loaded it meanwhile; keep the first copy
+            entry = self._entries.get(session_id)
+            if entry:
+                return entry[1]
+            if chat_session is None:
+                chat_session = ChatSession(session_id=session_id)
+                self._dirty[session_id] = chat_session
+            self._entries[session_id] = (now, chat_session)
+            self._evict(now)
+        return chat_session
+
+    def mark_dirty(self, chat_session: ChatSession):
+        """Queue a changed session for the next flush"""
+        chat_session.updated_at = datetime.utcnow()
+        with self._lock:
+            self._dirty[chat_session.session_id] = chat_session
+
+    def _evict(self, now: float):
+        # Caller holds the lock. Dirty sessions stay reachable through _dirty until flushed.
+        while self._entries:
+            session_id, (last_access, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - last_access <= self.ttl_seconds:
+                break
+            del self._entries[session_id]
+            self.evictions += 1
+
+    def flush(self) -> int:
+        """Upsert every dirty session in one batch; returns rows written"""
+        with self._lock:
+            self._evict(time.monotonic())
+            if not self._dirty:
+                return 0
+            pending, self._dirty = self._dirty, {}
+            self._flushing = pending
+            rows = [s.model_dump(exclude={'id'}) for s in pending.values()]
+
+        try:
+            written = bulk_upsert(ChatSession, rows, conflict_column='session_id')
+        except Exception:
+            # Requeue anything not changed again since, so the next flush retries it
+            with self._lock:
+                for session_id, chat_session in pending.items():
+                    self._dirty.setdefault(session_id, chat_session)
+            raise
+        finally:
+            with self._lock:
+                self._flushing = {}
+
+        self.flushes += 1
+        self.flushed_rows += written
+        return written
+
+    async def start(self, interval_seconds: float = 2.0):
+        """Flush dirty sessions every interval until stopped"""
+        self._running = True
+        while self._running:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"[SessionStore] Error during flush: {e}")
+
+    def stop(self):
+        self._running = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'dirty': len(self._dirty),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+        }
+
+
+# Global instance for ConciergeAgent chat turns
+session_store = ChatSessionStore()
@@ -0,0 +1,194 @@
+"""
+In-memory index of active price/inventory watches
+
+Watches are grouped by deal_id with their thresholds kept sorted, so a
+deal update only has to bisect for the thresholds it crossed instead of
+scanning the Watch table.
+"""
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.models.database import Flight, Hotel, Watch, engine
+from app.models.schemas import DealType, WatchEvent, WatchEventType
+
+
+@dataclass
+class IndexedWatch:
+    """The parts of a Watch row needed to evaluate it"""
+    watch_id: str
+    deal_id: str
+    deal_type: str
+    price_threshold: Optional[float] = None
+    inventory_threshold: Optional[int] = None
+
+
+class WatchIndex:
+    """
+    Active watches keyed by deal_id, ordered by price and inventory threshold.
+
+    Also remembers the last price and inventory seen for each watched deal,
+    which is what a threshold crossing is measured against.
+    """
+
+    def __init__(self):
+        self._watches: Dict[str, IndexedWatch] = {}
+        self._price_thresholds: Dict[str, List[Tuple[float, str]]] = {}
+        self._inventory_thresholds: Dict[str, List[Tuple[int, str]]] = {}
+        self._last_seen: Dict[str, Tuple[float, int]] = {}
+
+    # ==========================================
+    # MAINTENANCE
+    # ==========================================
+
+    def rebuild(self):
+        """Reload all active watches and the current state of their deals from SQLite"""
+        self._watches.clear()
+        self._price_thresholds.clear()
+        self._inventory_thresholds.clear()
+        self._last_seen.clear()
+
+        with Session(engine) as session:
+            watches = session.exec(select(Watch).where(Watch.is_active == True)).all()
+            for watch in watches:
+                self._insert(watch)
+
+            deal_ids = list({w.deal_id for w in self._watches.values()})
+            for start in range(0, len(deal_ids), 500):
+                chunk = deal_ids[start:start + 500]
+                for f in session.exec(select(Flight).where(Flight.deal_id.in_(chunk))):
+                    self._last_seen[f.deal_id] = (f.price, f.seats_available)
+                for h in session.exec(select(Hotel).where(Hotel.deal_id.in_(chunk))):
+                    self._last_seen[h.deal_id] = (h.price_per_night, h.rooms_available)
+
+        print(f"[WatchIndex] Loaded {len(self._watches)} active watches")
+
+    def add(self, watch: Watch, current_price: Optional[float] = None, current_inventory: Optional[int] = None):
+        """Index a newly created watch, optionally with the deal's current state"""
+        self._insert(watch)
+        if current_price is not None and current_inventory is not None:
+            self._last_seen.setdefault(watch.deal_id, (current_price, current_inventory))
+
+    def remove(self, watch_id: str):
+        """Drop a deleted/deactivated watch"""
+        watch = self._watches.pop(watch_id, None)
+        if not watch:
+            return
+
+        if watch.price_threshold is not None:
+            self._discard(self._price_thresholds, watch.deal_id, (watch.price_threshold, watch_id))
+        if watch.inventory_threshold is not None:
+            self._discard(self._inventory_thresholds, watch.deal_id, (watch.inventory_threshold, watch_id))
+
+        if not self._price_thresholds.get(watch.deal_id) and not self._inventory_thresholds.get(watch.deal_id):
+            self._last_seen.pop(watch.deal_id, None)
+
+    def _insert(self, watch: Watch):
+        # Bundle watches from chat are not tied to a single flight/hotel deal yet
+        if watch.deal_type not in (DealType.FLIGHT.value, DealType.HOTEL.value):
+            return
+        if watch.watch_id in self._watches:
+            self.remove(watch.watch_id)
+
+        self._watches[watch.watch_id] = IndexedWatch(
+            watch_id=watch.watch_id,
+            deal_id=watch.deal_id,
+            deal_type=watch.deal_type,
+            price_threshold=watch.price_threshold,
+            inventory_threshold=watch.inventory_threshold
+        )
+        if watch.price_threshold is not None:
+            insort(self._price_thresholds.setdefault(watch.deal_id, []), (watch.price_threshold, watch.watch_id))
+        if watch.inventory_threshold is not None:
+            insort(self._inventory_thresholds.setdefault(watch.deal_id, []), (watch.inventory_threshold, watch.watch_id))
+
+    @staticmethod
+    def _discard(index: Dict[str, list], deal_id: str, entry: tuple):
+        entries = index.get(deal_id)
+        if not entries:
+            return
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        if not entries:
+            del index[deal_id]
+
+    def __contains__(self, deal_id: str) -> bool:
+        return deal_id in self._price_thresholds or deal_id in self._inventory_thresholds
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._watches)
+
+    # ==========================================
+    # EVALUATION
+    # ==========================================
+
+    def evaluate(self, deal_id: str, deal_type: str, price: float, inventory: int) -> List[WatchEvent]:
+        """
+        Record a deal update and return events for every watch whose
+        threshold was crossed by it.
+        """
+        if deal_id not in self:
+            return []
+
+        previous = self._last_seen.get(deal_id)
+        self._last_seen[deal_id] = (price, inventory)
+        # Without a baseline every threshold the deal is already under counts as crossed
+        prev_price, prev_inventory = previous if previous else (float('inf'), float('inf'))
+
+        events = []
+        price_entries = self._price_thresholds.get(deal_id, [])
+        inventory_entries = self._inventory_thresholds.get(deal_id, [])
+
+        if inventory <= 0 < prev_inventory:
+            for _, watch_id in price_entries + inventory_entries:
+                events.append(self._event(
+                    watch_id, WatchEventType.SOLD_OUT, deal_id, deal_type,
+                    previous_value=prev_inventory if previous else inventory,
+                    current_value=inventory,
+                    threshold=0,
+                    message=f"Sold out: {deal_id} has no inventory left"
+                ))
+            return events
+
+        # Price crossed downward: current <= threshold < previous
+        lo = bisect_left(price_entries, (price, ''))
+        hi = bisect_left(price_entries, (prev_price, ''))
+        for threshold, watch_id in price_entries[lo:hi]:
+            events.append(self._event(
+                watch_id, WatchEventType.PRICE_DROP, deal_id, deal_type,
+                previous_value=prev_price if previous else price,
+                current_value=price,
+                threshold=threshold,
+                message=f"Price dropped to ${price:.2f} (your target: ${threshold:.2f})"
+            ))
+
+        # Inventory crossed downward: current < threshold <= previous
+        lo = bisect_right(inventory_entries, (inventory, '\uffff'))
+        hi = bisect_right(inventory_entries, (prev_inventory, '\uffff'))
+        for threshold, watch_id in inventory_entries[lo:hi]:
+            events.append(self._event(
+                watch_id, WatchEventType.INVENTORY_LOW, deal_id, deal_type,
+                previous_value=prev_inventory if previous else inventory,
+                current_value=inventory,
+                threshold=threshold,
+                message=f"Only {inventory} left (alert under {threshold})"
+            ))
+
+        return events
+
+    def _event(self, watch_id: str, event_type: WatchEventType, deal_id: str, deal_type: str, **fields) -> WatchEvent:
+        return WatchEvent(
+            watch_id=watch_id,
+            event_type=event_type,
+            deal_id=deal_id,
+            deal_type=DealType(deal_type),
+            **fields
+        )
+
+
+# Global instance
+watch_index = WatchIndex()
@@ -3,10 +3,12 @@ WebSocket Connection Manager for real-time updates
 """
 import json
 import asyncio
-from typing import Dict, List, Set, Any
+from typing import Dict, List, Set, Any, Optional
 from fastapi import WebSocket
 from datetime import datetime
 
+from app.services.metrics import websocket_send_failures
+
 
 class ConnectionManager:
     """
@@ -29,6 +31,9 @@ class ConnectionManager:
             'hotel': set(),
             'all': set()
         }
+        
+        # Connections that asked for deals_batch frames instead of one frame per deal
+        self.batched_connections: Set[WebSocket] = set()
     
     async def connect(self, websocket: WebSocket, session_id: str = None):
         """Accept and register a new WebSocket connection"""
@@ -60,6 +65,7 @@ class ConnectionManager:
         # Remove from all subscriptions
         for deal_type in self.deal_subscriptions:
             self.deal_subscriptions[deal_type].discard(websocket)
+        self.batched_connections.discard(websocket)
         
         for watch_id in list(self.watch_subscriptions.keys()):
             self.watch_subscriptions[watch_id].discard(websocket)
@@ -72,6 +78,7 @@ class ConnectionManager:
             await websocket.send_json(message)
         except Exception as e:
             print(f"Error sending to websocket: {e}")
+            websocket_send_failures.inc()
             self.disconnect(websocket)
     
     async def send_to_session(self, session_id: str, message: dict):
@@ -83,20 +90,63 @@ class ConnectionManager:
     async def broadcast(self, message: dict, deal_type: str = 'all'):
         """Broadcast message to all relevant subscribers"""
         message['timestamp'] = datetime.utcnow().isoformat()
+        await self._send_text(self._recipients(deal_type), json.dumps(message))
+    
+    async def broadcast_deals(self, events: List[dict]):
+        """
+        Deliver a batch of new-deal events.
         
-        # Get relevant connections
-        connections = set()
-        connections.update(self.deal_subscriptions.get('all', set()))
+        Batched subscribers get a single deals_batch frame with the events
+        they subscribe to; everyone else gets one frame per event. Each
+        distinct frame is serialized once and shared by its recipients.
+        """
+        if not events:
+            return
+        timestamp = datetime.utcnow().isoformat()
+        for event in events:
+            event['timestamp'] = timestamp
         
+        # Per-event delivery
+        for event in events:
+            recipients = self._recipients(event.get('deal_type', 'all')) - self.batched_connections
+            if recipients:
+                await self._send_text(recipients, json.dumps(event))
+        
+        # Batched delivery, grouped by the deal types each connection receives
+        groups: Dict[frozenset, Set[WebSocket]] = {}
+        for websocket in self.batched_connections:
+            groups.setdefault(self._deal_types_for(websocket), set()).add(websocket)
+        
+        for deal_types, recipients in groups.items():
+            selected = [e for e in events if e.get('deal_type') in deal_types]
+            if selected:
+                frame = {
+                    'type': 'deals_batch',
+                    'count': len(selected),
+                    'deals': selected,
+                    'timestamp': timestamp
+                }
+                await self._send_text(recipients, json.dumps(frame))
+    
+    def _recipients(self, deal_type: str) -> Set[WebSocket]:
+        connections = set(self.deal_subscriptions.get('all', set()))
         if deal_type in self.deal_subscriptions:
             connections.update(self.deal_subscriptions[deal_type])
-        
-        # Send to all
+        return connections
+    
+    def _deal_types_for(self, websocket: WebSocket) -> frozenset:
+        if websocket in self.deal_subscriptions['all']:
+            return frozenset(('flight', 'hotel'))
+        return frozenset(t for t, subs in self.deal_subscriptions.items() if websocket in subs)
+    
+    async def _send_text(self, connections: Set[WebSocket], text: str):
+        """Send a pre-serialized frame, dropping connections that fail"""
         disconnected = []
         for websocket in connections:
             try:
-                await websocket.send_json(message)
+                await websocket.send_text(text)
             except Exception:
+                websocket_send_failures.inc()
                 disconnected.append(websocket)
         
         # Clean up disconnected
@@ -114,6 +164,7 @@ class ConnectionManager:
             try:
                 await websocket.send_json(event)
             except Exception:
+                websocket_send_failures.inc()
                 disconnected.append(websocket)
         
         for ws in disconnected:
@@ -125,15 +176,80 @@ class ConnectionManager:
             self.watch_subscriptions[watch_id] = set()
         self.watch_subscriptions[watch_id].add(websocket)
     
-    def subscribe_to_deals(self, websocket: WebSocket, deal_type: str):
-        """Subscribe to deal updates for specific type"""
+    def subscribe_to_deals(self, websocket: WebSocket, deal_type: str, delivery: str = 'per_event'):
+        """Subscribe to deal updates for specific type ('per_event' or 'batched' delivery)"""
         if deal_type in self.deal_subscriptions:
             self.deal_subscriptions[deal_type].add(websocket)
+        
+        if delivery == 'batched':
+            self.batched_connections.add(websocket)
+        else:
+            self.batched_connections.discard(websocket)
     
     @property
     def connection_count(self) -> int:
         """Get current connection count"""
         return len(self.active_connections)
+    
+    def subscription_counts(self) -> Dict[str, int]:
+        """Number of subscribers per deal type and across watches"""
+        counts = {f'deals:{t}': len(subs) for t, subs in self.deal_subscriptions.items()}
+        counts['watches'] = sum(len(subs) for subs in self.watch_subscriptions.values())
+        counts['batched'] = len(self.batched_connections)
+        return counts
+
+
+class DealEventBatcher:
+    """
+    Collects new-deal events during a scan and flushes them through
+    ConnectionManager.broadcast_deals when max_batch_size events are
+    pending or every flush_interval seconds, whichever comes first.
+    """
+    
+    def __init__(self, manager: ConnectionManager, max_batch_size: int = 200, flush_interval: float = 0.5):
+        self.manager = manager
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.events_sent = 0
+        self.flushes = 0
+    
+    def start(self):
+        """Start the periodic flush task"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+    
+    async def add(self, event: dict):
+        """Queue an event, flushing immediately if the batch is full"""
+        self._pending.append(event)
+        if len(self._pending) >= self.max_batch_size:
+            await self.flush()
+    
+    async def flush(self):
+        """Send everything pending"""
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        self.events_sent += len(events)
+        self.flushes += 1
+        await self.manager.broadcast_deals(events)
+    
+    async def close(self):
+        """Stop the periodic flush and send what is left"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
 
 
 # Global instance
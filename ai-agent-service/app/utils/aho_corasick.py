@@ -0,0 +1,85 @@
+"""
+Aho-Corasick multi-pattern matcher
+
+Finds every occurrence of any number of substring patterns in a single
+left-to-right pass over the text, so matching cost depends on the length
+of the text rather than on how many patterns there are.
+"""
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Trie of patterns with failure links. Each pattern carries a value that
+    is reported when the pattern occurs; overlapping and nested occurrences
+    are all reported.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Any, ...]] = [()]
+        self._built = True
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def add(self, pattern: str, value: Any):
+        if not pattern:
+            raise ValueError("Empty pattern")
+
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node] += (value,)
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first; called automatically when needed"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        for node in queue:
+            fail[node] = 0
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                # A node also reports every pattern that is a suffix of its own
+                out[child] += out[fail[child]]
+
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """Yield (end index, value) for every pattern occurrence in text"""
+        if not self._built:
+            self.build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for value in out[node]:
+                yield i, value
+
+    def values_in(self, text: str) -> Set[Any]:
+        """Distinct values of all patterns occurring in text"""
+        return {value for _, value in self.iter_matches(text)}
+
+    @property
+    def node_count(self) -> int:
+        return len(self._goto)
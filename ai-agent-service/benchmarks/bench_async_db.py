@@ -0,0 +1,174 @@
+"""
+Benchmark: request latency under concurrency, blocking vs aiosqlite handlers
+
+Run from ai-agent-service/:
+    python benchmarks/bench_async_db.py [--concurrency 200] [--flights 50000] [--hotels 20000]
+
+Seeds a throwaway database, then fires `concurrency` simultaneous
+/deals/flights and /deals/hotels requests, plus the same number of /health
+probes, at two apps in-process: "blocking" serves /deals/* with the old
+handlers (synchronous Session inside async def), "async" is app.main with
+its aiosqlite handlers. Probes show how long the event loop is stalled
+behind database work.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The engines are created at import time, so point them at a scratch file first
+_db_dir = tempfile.mkdtemp(prefix="kayak-bench-")
+os.environ["KAYAK_AI_DB_PATH"] = os.path.join(_db_dir, "bench.db")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Query  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from app.main import app as async_app, flight_deal_json, hotel_deal_json  # noqa: E402
+from app.models.database import Flight, Hotel, bulk_upsert, create_db_and_tables, engine  # noqa: E402
+from app.models.deal_bits import flight_flag_bits, hotel_flag_bits  # noqa: E402
+from app.services.city_search import city_key  # noqa: E402
+
+
+AIRPORTS = ['SFO', 'LAX', 'JFK', 'MIA', 'ORD', 'SEA', 'BOS', 'DEN']
+CITIES = ['Miami', 'New York', 'Los Angeles', 'Chicago', 'Seattle', 'Boston', 'Denver', 'San Francisco']
+
+
+def seed(n_flights: int, n_hotels: int, seed: int = 5):
+    rng = random.Random(seed)
+    base = datetime(2026, 12, 1)
+    flights = []
+    for i in range(n_flights):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        departure = base + timedelta(hours=rng.randint(0, 24 * 60))
+        price = round(rng.uniform(80, 600), 2)
+        flights.append(dict(
+            deal_id=f"FLT-{i:07d}", origin=origin, destination=destination, airline='Test',
+            departure_time=departure, arrival_time=departure + timedelta(hours=4),
+            duration_minutes=240, stops=0, price=price, original_price=price * 1.2,
+            seats_available=rng.randint(1, 50), deal_score=rng.randint(0, 100), is_active=True,
+            tag_bits=0, flag_bits=flight_flag_bits(departure, 'Economy'),
+        ))
+    hotels = []
+    for i in range(n_hotels):
+        price = round(rng.uniform(60, 450), 2)
+        pet_friendly = rng.random() < 0.4
+        city = rng.choice(CITIES)
+        hotels.append(dict(
+            deal_id=f"HTL-{i:07d}", name=f"Hotel {i}", city=city, city_key=city_key(city), neighborhood='Downtown',
+            stars=rng.randint(3, 5), price_per_night=price, original_price=price * 1.2,
+            rooms_available=rng.randint(1, 30), pet_friendly=pet_friendly,
+            deal_score=rng.randint(0, 100), is_active=True,
+            tag_bits=0, amenity_bits=0, flag_bits=hotel_flag_bits(pet_friendly, False, False, 'Non-refundable'),
+        ))
+    bulk_upsert(Flight, flights, chunk_size=5000)
+    bulk_upsert(Hotel, hotels, chunk_size=5000)
+
+
+def build_blocking_app() -> FastAPI:
+    """/deals/* as they were: synchronous sessions on the event loop"""
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/deals/flights")
+    async def flights(origin: Optional[str] = Query(None), destination: Optional[str] = Query(None),
+                      limit: int = Query(10, ge=1, le=50)):
+        with Session(engine) as session:
+            query = select(Flight).where(Flight.is_active == True)
+            if origin:
+                query = query.where(Flight.origin == origin.upper())
+            if destination:
+                query = query.where(Flight.destination == destination.upper())
+            rows = session.exec(query.order_by(Flight.deal_score.desc()).limit(limit)).all()
+            return {"deals": [flight_deal_json(f) for f in rows], "count": len(rows)}
+
+    @app.get("/deals/hotels")
+    async def hotels(city: Optional[str] = Query(None), pet_friendly: Optional[bool] = Query(None),
+                     limit: int = Query(10, ge=1, le=50)):
+        with Session(engine) as session:
+            query = select(Hotel).where(Hotel.is_active == True)
+            if city:
+                query = query.where(Hotel.city.ilike(f"%{city}%"))
+            if pet_friendly is not None:
+                query = query.where(Hotel.pet_friendly == pet_friendly)
+            rows = session.exec(query.order_by(Hotel.deal_score.desc()).limit(limit)).all()
+            return {"deals": [hotel_deal_json(h) for h in rows], "count": len(rows)}
+
+    return app
+
+
+def make_paths(n: int, seed: int = 9):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            paths.append(f"/deals/flights?origin={rng.choice(AIRPORTS)}&limit=20")
+        else:
+            paths.append(f"/deals/hotels?city={rng.choice(CITIES).split()[0].lower()}&pet_friendly=true&limit=20")
+    return paths
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_load(app: FastAPI, paths, probes: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def timed(path: str, due: float):
+            # Latency counts from when the request was due, not from when the
+            # loop got around to sending it, or a stalled loop would hide itself
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            response = await client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            return (time.perf_counter() - due) * 1000
+
+        # Warm the connection pool and SQLite page cache
+        now = time.perf_counter()
+        await asyncio.gather(*(timed(p, now) for p in paths[:10]))
+
+        started = time.perf_counter()
+        # All database requests arrive at once; probes are spread over the first part of the burst
+        db_task = asyncio.gather(*(timed(p, started) for p in paths))
+        probe_task = asyncio.gather(*(timed("/health", started + i * 0.002) for i in range(probes)))
+        db_latencies, probe_latencies = await asyncio.gather(db_task, probe_task)
+        wall = time.perf_counter() - started
+
+    return db_latencies, probe_latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--flights", type=int, default=50000)
+    parser.add_argument("--hotels", type=int, default=20000)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    seed(args.flights, args.hotels)
+    paths = make_paths(args.concurrency)
+
+    print(f"{args.concurrency} concurrent /deals/* requests + {args.concurrency} /health probes")
+    print(f"{'handlers':>10} {'deals p50':>10} {'deals p99':>10} {'health p50':>11} {'health p99':>11} {'req/s':>7}")
+    for name, app in (('blocking', build_blocking_app()), ('async', async_app)):
+        db, probes, wall = asyncio.run(run_load(app, paths, args.concurrency))
+        print(
+            f"{name:>10} {percentile(db, 0.5):>10.1f} {percentile(db, 0.99):>10.1f} "
+            f"{percentile(probes, 0.5):>11.1f} {percentile(probes, 0.99):>11.1f} {len(paths) / wall:>7.0f}"
+        )
+    print("(latencies in ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: N single /bundles calls vs one /bundles/batch call
+
+Run from ai-agent-service/:
+    python benchmarks/bench_bundle_batch.py [--sizes 100 300] [--tiles 30]
+
+Simulates a metasearch page: `tiles` bundle requests from one origin,
+spread over destinations, dates and budgets, served in-process through
+the real FastAPI app on a fixed snapshot (no result cache). Checks that
+the batch returns the same bundles as the single calls.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import app.main as service  # noqa: E402
+from bench_bundle_search import AIRPORTS, StaticIndex, make_snapshot  # noqa: E402
+from app.agents.concierge_agent import ConciergeAgent  # noqa: E402
+
+
+def make_tiles(n: int, origin: str = 'SFO', seed: int = 3):
+    rng = random.Random(seed)
+    destinations = [a for a in AIRPORTS if a != origin]
+    tiles = []
+    for i in range(n):
+        departure = date(2026, 12, 3) + timedelta(days=rng.choice([0, 0, 7]))
+        tiles.append({
+            'origin': origin,
+            'destination': destinations[i % len(destinations)],
+            'departure_date': departure.isoformat(),
+            'return_date': (departure + timedelta(days=3)).isoformat(),
+            'budget': rng.choice([800, 1500, 3000]),
+            'pet_friendly': rng.random() < 0.3,
+            'breakfast_required': rng.random() < 0.3,
+        })
+    return tiles
+
+
+def summarize(response: dict):
+    return [(b['flight']['deal_id'], b['hotel']['deal_id'], b['fit_score']) for b in response['bundles']]
+
+
+async def run(tiles, rounds: int):
+    transport = httpx.ASGITransport(app=service.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single_ms, batch_ms = [], []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            singles = [(await client.post('/bundles', json=tile)).json() for tile in tiles]
+            single_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            batch = (await client.post('/bundles/batch', json={'requests': tiles})).json()
+            batch_ms.append((time.perf_counter() - started) * 1000)
+
+            assert [summarize(r) for r in batch['results']] == [summarize(r) for r in singles]
+    return sum(single_ms) / rounds, sum(batch_ms) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--tiles", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'per metro':>10} {'tiles':>6} {'N x /bundles (ms)':>18} {'/bundles/batch (ms)':>20} {'speedup':>8}")
+    for size in args.sizes:
+        service.concierge_agent = ConciergeAgent(deal_index=StaticIndex(make_snapshot(size)))
+        single, batch = asyncio.run(run(make_tiles(args.tiles), args.rounds))
+        print(f"{size:>10} {args.tiles:>6} {single:>18.1f} {batch:>20.1f} {single / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: time and allocations per /bundles search, eager vs lazy bundles
+
+Run from ai-agent-service/:
+    python benchmarks/bench_bundle_materialization.py [--sizes 20 50 100] [--queries 50]
+
+"eager" is the old approach: a full TravelBundle (Pydantic models,
+explanations, decoded tags, a uuid) for every candidate pair, then sort and
+slice. "lazy exhaustive" and "lazy top-k" rank BundleCandidates and only
+materialize the bundles returned. Allocation figures come from tracemalloc
+in a separate pass so they don't skew the timings.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bundle_search import StaticIndex, make_intents, make_snapshot, summarize  # noqa: E402
+from app.agents.concierge_agent import ConciergeAgent  # noqa: E402
+from app.services.deal_index import BREAKFAST_INCLUDED, NEAR_TRANSIT, PET_FRIENDLY  # noqa: E402
+
+
+LIMIT = 5  # what /bundles asks for
+
+
+def eager_find_bundles(agent: ConciergeAgent, intent, limit: int = LIMIT):
+    """find_bundles as it was before candidates were ranked lazily"""
+    snapshot = agent.deal_index.current
+    destinations = None
+    if intent.get('destination') == 'WARM':
+        destinations = agent.warm_destinations
+    elif intent.get('destination'):
+        destinations = [intent['destination']]
+    departs_after, departs_before = agent._departure_window(intent)
+    flights = snapshot.flights(
+        origin=intent.get('origin'), destinations=destinations,
+        departs_after=departs_after, departs_before=departs_before
+    )
+
+    flags = (
+        (PET_FRIENDLY if intent.get('pet_friendly') else 0)
+        | (BREAKFAST_INCLUDED if intent.get('breakfast_required') else 0)
+        | (NEAR_TRANSIT if intent.get('near_transit') else 0)
+    )
+
+    bundles = []
+    for flight in flights:
+        for hotel in snapshot.hotels_near(flight.destination, flags):
+            bundle = agent.create_bundle(flight, hotel, intent)
+            if intent.get('budget') and bundle.total_price > intent['budget'] * 1.1:
+                continue
+            bundles.append(bundle)
+
+    bundles.sort(key=lambda b: b.fit_score, reverse=True)
+    return bundles[:limit]
+
+
+def measure(search, intents):
+    """(ms per request, mean peak KiB allocated while serving a request)"""
+    started = time.perf_counter()
+    for intent in intents:
+        search(intent)
+    ms = (time.perf_counter() - started) / len(intents) * 1000
+
+    peaks = []
+    tracemalloc.start()
+    for intent in intents:
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        search(intent)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    return ms, sum(peaks) / len(peaks) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'per metro':>10} {'mode':>16} {'ms/request':>11} {'peak KiB':>10}")
+
+    for size in args.sizes:
+        agent = ConciergeAgent(deal_index=StaticIndex(make_snapshot(size)))
+        intents = make_intents(args.queries)
+
+        modes = {
+            'eager': lambda intent: eager_find_bundles(agent, intent),
+            'lazy exhaustive': lambda intent: agent.find_bundles(intent, LIMIT, exhaustive=True),
+            'lazy top-k': lambda intent: agent.find_bundles(intent, LIMIT),
+        }
+
+        for intent in intents:
+            expected = summarize(modes['eager'](intent))
+            assert summarize(modes['lazy exhaustive'](intent)) == expected, intent
+            assert summarize(modes['lazy top-k'](intent)) == expected, intent
+
+        for name, search in modes.items():
+            ms, peak_kib = measure(search, intents)
+            print(f"{size:>10} {name:>16} {ms:>11.2f} {peak_kib:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: exhaustive vs top-k bundle search
+
+Run from ai-agent-service/:
+    python benchmarks/bench_bundle_search.py [--sizes 20 100 300] [--queries 200]
+
+Each size is the number of flights and hotels per metro. Also checks that
+both modes return the same bundles for randomized intents.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.concierge_agent import ConciergeAgent  # noqa: E402
+from app.models.database import Flight, Hotel  # noqa: E402
+from app.services.deal_index import DealSnapshot  # noqa: E402
+
+
+AIRPORTS = ['SFO', 'LAX', 'JFK', 'MIA', 'ORD', 'SEA']
+POLICIES = ['Free cancellation', 'Non-refundable', 'Partial refund']
+
+
+class StaticIndex:
+    """Stands in for DealIndex with a fixed snapshot"""
+
+    def __init__(self, snapshot: DealSnapshot):
+        self.current = snapshot
+
+
+def make_snapshot(per_metro: int, seed: int = 7) -> DealSnapshot:
+    rng = random.Random(seed)
+    base = datetime(2026, 12, 1)
+    flights, hotels = [], []
+
+    for origin in AIRPORTS:
+        for _ in range(per_metro):
+            destination = rng.choice([a for a in AIRPORTS if a != origin])
+            departure = base + timedelta(days=rng.randint(0, 30), hours=rng.randint(0, 23))
+            price = round(rng.uniform(80, 600), 2)
+            flights.append(Flight(
+                id=len(flights) + 1, deal_id=f"FLT-{len(flights):06d}",
+                origin=origin, destination=destination, airline='Test',
+                departure_time=departure, arrival_time=departure + timedelta(hours=4),
+                duration_minutes=240, stops=rng.choice([0, 0, 1]),
+                price=price, original_price=round(price * 1.2, 2),
+                seats_available=rng.randint(1, 50), deal_score=rng.randint(0, 100)
+            ))
+
+    for metro in AIRPORTS:
+        for _ in range(per_metro):
+            price = round(rng.uniform(60, 450), 2)
+            hotels.append(Hotel(
+                id=len(hotels) + 1, deal_id=f"HTL-{len(hotels):06d}",
+                name='Test Hotel', city=metro, neighborhood='Downtown', stars=rng.randint(3, 5),
+                metro_code=metro, price_per_night=price, original_price=round(price * 1.2, 2),
+                rooms_available=rng.randint(1, 30), cancellation_policy=rng.choice(POLICIES),
+                pet_friendly=rng.random() < 0.4, breakfast_included=rng.random() < 0.4,
+                near_transit=rng.random() < 0.4, deal_score=rng.randint(0, 100)
+            ))
+
+    return DealSnapshot.build(flights, hotels, generation=1)
+
+
+def make_intents(n: int, seed: int = 11):
+    rng = random.Random(seed)
+    intents = []
+    for _ in range(n):
+        departure = date(2026, 12, 1) + timedelta(days=rng.randint(0, 20))
+        intents.append({
+            'origin': rng.choice(AIRPORTS + [None]),
+            'destination': rng.choice(AIRPORTS + [None, 'WARM']),
+            'departure_date': departure,
+            'return_date': departure + timedelta(days=rng.randint(1, 7)),
+            'budget': rng.choice([400, 800, 1500, 3000, 6000]),
+            'pet_friendly': rng.random() < 0.3,
+            'avoid_red_eye': rng.random() < 0.3,
+            'breakfast_required': rng.random() < 0.3,
+            'refundable_preferred': rng.random() < 0.3,
+            'near_transit': rng.random() < 0.2,
+        })
+    return intents
+
+
+def summarize(bundles):
+    return [(b.flight.deal_id, b.hotel.deal_id, b.fit_score, b.total_price) for b in bundles]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 300])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'per metro':>10} {'max pairs':>10} {'exhaustive (ms)':>16} {'top-k (ms)':>11} {'speedup':>8}")
+
+    for size in args.sizes:
+        agent = ConciergeAgent(deal_index=StaticIndex(make_snapshot(size)))
+        intents = make_intents(args.queries)
+        # Exhaustive search is quadratic; keep the biggest sizes affordable
+        reference = intents if size <= 100 else intents[:max(1, args.queries // 20)]
+
+        started = time.perf_counter()
+        expected = [agent.find_bundles(intent, args.limit, exhaustive=True) for intent in reference]
+        exhaustive_ms = (time.perf_counter() - started) / len(reference) * 1000
+
+        started = time.perf_counter()
+        results = [agent.find_bundles(intent, args.limit) for intent in intents]
+        top_k_ms = (time.perf_counter() - started) / len(intents) * 1000
+
+        for intent, want, got in zip(reference, expected, results):
+            assert summarize(want) == summarize(got), intent
+
+        pairs = len(AIRPORTS) * size * size
+        print(f"{size:>10} {pairs:>10} {exhaustive_ms:>16.2f} {top_k_ms:>11.2f} {exhaustive_ms / top_k_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
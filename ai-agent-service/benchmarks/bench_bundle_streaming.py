@@ -0,0 +1,60 @@
+"""
+Benchmark: time to first streamed bundle vs a full bundle search
+
+Run from ai-agent-service/:
+    python benchmarks/bench_bundle_streaming.py [--sizes 100 300 1000] [--queries 50]
+
+"full" is find_bundles, which returns only once every candidate flight
+has been considered. "first partial" is how long iter_bundles takes to
+yield its first frame; "stream total" is the whole stream. Also checks
+the last streamed top equals find_bundles for every intent.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bundle_search import StaticIndex, make_intents, make_snapshot, summarize  # noqa: E402
+from app.agents.concierge_agent import ConciergeAgent  # noqa: E402
+
+
+LIMIT = 3  # what chat asks for
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'per metro':>10} {'full (ms)':>10} {'first partial (ms)':>19} {'stream total (ms)':>18}")
+
+    for size in args.sizes:
+        agent = ConciergeAgent(deal_index=StaticIndex(make_snapshot(size)))
+        # Wide searches are the ones worth streaming
+        intents = [dict(i, origin=None, destination=d) for i, d in zip(make_intents(args.queries), [None, 'WARM'] * args.queries)]
+
+        full_ms, first_ms, stream_ms = [], [], []
+        for intent in intents:
+            started = time.perf_counter()
+            expected = agent.find_bundles(intent, LIMIT)
+            full_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            first, top = None, []
+            for _, top in agent.iter_bundles(intent, LIMIT):
+                if first is None:
+                    first = (time.perf_counter() - started) * 1000
+            stream_ms.append((time.perf_counter() - started) * 1000)
+            first_ms.append(first if first is not None else stream_ms[-1])
+
+            assert summarize(top) == summarize(expected), intent
+
+        n = len(intents)
+        print(f"{size:>10} {sum(full_ms) / n:>10.2f} {sum(first_ms) / n:>19.2f} {sum(stream_ms) / n:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
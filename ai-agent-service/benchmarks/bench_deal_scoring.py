@@ -0,0 +1,82 @@
+"""
+Benchmark: scalar detect_deal vs vectorized score_deals_batch
+
+Run from ai-agent-service/:
+    python benchmarks/bench_deal_scoring.py [--sizes 10000 100000 1000000]
+
+Also checks that both paths agree on every row.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.makedirs("data", exist_ok=True)
+
+from app.agents.deals_agent import DealsAgent  # noqa: E402
+from app.services.deal_scoring import score_deals_batch, tags_from_bits  # noqa: E402
+
+
+def make_listings(n: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    avg = rng.uniform(100, 500, n)
+    avg[rng.random(n) < 0.05] = np.nan  # some listings without history
+    price = np.where(np.isnan(avg), 300.0, avg) * rng.uniform(0.65, 1.1, n)
+    inventory = rng.integers(0, 50, n)
+    is_promo = rng.random(n) < 0.1
+    promo_end_days = np.where(is_promo, rng.integers(0, 10, n), 0)
+    return price, avg, inventory, is_promo, promo_end_days
+
+
+def run_scalar(agent, price, avg, inventory, is_promo, promo_end_days):
+    return [
+        agent.detect_deal(
+            current_price=float(price[i]),
+            avg_30d_price=None if np.isnan(avg[i]) else float(avg[i]),
+            inventory=int(inventory[i]),
+            is_promo=bool(is_promo[i]),
+            promo_end_days=int(promo_end_days[i])
+        )
+        for i in range(len(price))
+    ]
+
+
+def check_parity(scalar_results, scores):
+    for i, result in enumerate(scalar_results):
+        assert result.is_deal == bool(scores.is_deal[i]), i
+        assert result.score.total_score == int(scores.total_score[i]), i
+        assert result.score.price_score == int(scores.price_score[i]), i
+        assert result.tags == tags_from_bits(int(scores.tag_bits[i])), i
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    agent = DealsAgent()
+    print(f"{'listings':>10} {'scalar (s)':>12} {'batch (s)':>12} {'speedup':>9} {'deals':>9}")
+
+    for n in args.sizes:
+        columns = make_listings(n)
+
+        started = time.perf_counter()
+        scalar_results = run_scalar(agent, *columns)
+        scalar_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scores = score_deals_batch(*columns)
+        batch_time = time.perf_counter() - started
+
+        check_parity(scalar_results, scores)
+        print(
+            f"{n:>10} {scalar_time:>12.3f} {batch_time:>12.4f} "
+            f"{scalar_time / batch_time:>8.0f}x {int(scores.is_deal.sum()):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
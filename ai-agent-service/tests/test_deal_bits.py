@@ -0,0 +1,19 @@
+from app.models.deal_bits import AMENITIES, amenities_to_bits, amenity_bit
+
+
+def test_simple_backend_amenity_spellings_share_vocabulary_bits():
+    assert amenity_bit('WiFi') == amenity_bit('Free WiFi')
+    assert amenity_bit('Breakfast') == amenity_bit('Free breakfast')
+    assert amenity_bit('Room Service') == amenity_bit('Room service')
+
+
+def test_every_simple_backend_amenity_is_encoded():
+    feed_amenities = ['Parking', 'Gym', 'Restaurant', 'Pool', 'Breakfast', 'Spa', 'Room Service', 'Bar', 'WiFi']
+    bits = amenities_to_bits(feed_amenities)
+    assert all(bits & amenity_bit(name) for name in feed_amenities)
+    assert bin(bits).count('1') == len(feed_amenities)
+
+
+def test_vocabulary_bit_positions_are_unchanged():
+    assert amenity_bit('Free WiFi') == 1 << 0
+    assert amenity_bit('Business center') == 1 << (len(AMENITIES) - 1)
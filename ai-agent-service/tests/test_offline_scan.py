@@ -0,0 +1,17 @@
+import json
+
+from app import offline_scan
+from app.agents.deals_agent import DealsAgent
+
+
+def test_malformed_ndjson_lines_are_rejected_not_fatal(monkeypatch):
+    monkeypatch.setattr(offline_scan, '_worker_agent', DealsAgent(init_db=False))
+    hotel = {
+        'hotel_id': 'HTL-1', 'hotel_name': 'Harbor Inn', 'city': 'Boston',
+        'price_per_night': 120.0, 'amenities': ['WiFi'],
+    }
+    lines = [json.dumps(hotel), '{"hotel_id": "HTL-2"', '42']
+
+    read, rejected, _ = offline_scan.score_chunk('hotel', 'simple-backend', 'lines', lines)
+
+    assert (read, rejected) == (3, 2)